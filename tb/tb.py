@@ -1,19 +1,33 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json, os, sys, yaml, hcl, zipfile
-from fuzzywuzzy import fuzz
-import argparse, glob
-from subprocess import Popen, PIPE
-from pyfiglet import Figlet
-import requests
+import json, os, sys, yaml, zipfile, hashlib, shutil, importlib, codecs
+import argparse, glob, fnmatch
+from subprocess import Popen, PIPE, STDOUT, DEVNULL
 
-from collections import OrderedDict
-import re
+from collections import OrderedDict, ChainMap, Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import heapq, re, threading, bisect, select, struct
 
-from git import Repo, Remote, InvalidGitRepositoryError
 import time
 
+class LazyModule():
+    '''
+    stands for a module that is only imported when one of its attributes is first used
+    '''
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+# these take a while to import and most commands do not need all of them
+hcl = LazyModule("hcl")
+requests = LazyModule("requests")
+pyfiglet = LazyModule("pyfiglet")
+fuzz = LazyModule("fuzzywuzzy.fuzz")
+
 PACKAGE = "tb"
 LOG = True
 DEBUG=False
@@ -60,7 +74,7 @@ def run(cmd, splitlines=False, env=os.environ, raise_exception_on_fail=False):
 
     return (out, err, exitcode)
 
-def runshow(cmd, env=os.environ):
+def runshow(cmd, env=os.environ, capture=None):
     # you had better escape cmd cause it's goin to the shell as is
 
     stdout = sys.stdout
@@ -70,48 +84,358 @@ def runshow(cmd, env=os.environ):
         stdout = None
         strerr = None
 
+    if capture != None:
+        # stdout goes through capture on its way to the terminal, unbuffered for prompts without a newline
+        stdout = PIPE
+
     proc = Popen(cmd, stdout=stdout, stderr=stderr, shell=True, env=env)
-    proc.communicate()
+
+    if capture != None:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        for chunk in iter(lambda: os.read(proc.stdout.fileno(), 1 << 16), b''):
+            text = decoder.decode(chunk)
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            capture.feed(text)
+        capture.feed(decoder.decode(b'', final=True))
+        proc.stdout.close()
+
+    proc.wait()
 
     exitcode = int(proc.returncode)
 
     return exitcode
 
-def flatwalk_up(haystack, needle):
-    results = []
-    spl = needle.split("/")
-    needle_parts = [spl.pop(0)]
-    for s in spl:
-        add = "/".join([needle_parts[-1],s])
-        needle_parts.append(add)
-
-    for (folder, fn) in flatwalk(haystack):
-        for n in needle_parts:
-            if folder.endswith(n):
-                results.append((folder, fn))
+def runprefixed(cmd, prefix, env=os.environ, lock=None, capture=None):
+    # like runshow(), but every line of output is prefixed so that concurrent runs stay readable.
+    # stdin is not shared, concurrent runs cannot be interactive
+    proc = Popen(cmd, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT, shell=True, env=env)
+
+    for line in iter(proc.stdout.readline, b''):
+        if capture != None:
+            capture.feed(line.decode('utf-8', errors='replace'))
+        if LOG == True:
+            line = "{}{}".format(prefix, line.decode('utf-8', errors='replace'))
+            if lock != None:
+                with lock:
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+            else:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+
+    proc.wait()
+
+    return int(proc.returncode)
+
+# colors and styles of terminal output
+ANSI_REGEX = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+
+class OutputsCapture():
+    '''
+    the lines printed after the last "Outputs:" line of a terraform run, fed with its output as it is printed.
+    Nothing else is kept
+    '''
+
+    def __init__(self):
+        self.lines = None
+        self.partial = ""
+
+    def feed(self, text):
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            line = ANSI_REGEX.sub("", line)
+            if line.strip().startswith("Outputs:"):
+                self.lines = []
+            elif self.lines != None:
+                self.lines.append("    {}".format(line))
+
+    def outputs(self):
+        # None when the run printed no outputs
+        if self.partial != "":
+            self.feed("\n")
+        return self.lines
+
+# the start of a string, or punctuation. Numbers, true, false and null are skipped
+JSON_TOKEN_REGEX = re.compile(rb'["{}\[\]:,]')
+# the rest of a string, up to its closing quote or to a backslash at the end of the data
+JSON_STRING_REGEX = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*')
+# everything but brackets, whole strings included, then whole objects and arrays nested up to 4 deep.
+# Every alternative starts with a different character, a failed match does not backtrack much
+JSON_SKIP = rb'(?:[^"{}\[\]]|"[^"\\]*(?:\\.[^"\\]*)*")*'
+for i in range(4):
+    JSON_SKIP = rb'(?:[^"{}\[\]]|"[^"\\]*(?:\\.[^"\\]*)*"|\{' + JSON_SKIP + rb'\}|\[' + JSON_SKIP + rb'\])*'
+JSON_SKIP_REGEX = re.compile(JSON_SKIP)
+
+def json_member(chunks, path):
+    '''
+    the object or array found at path, a list of keys, of the JSON document read chunk by chunk, None when
+    there is none. Only that value is parsed, the rest of the document is scanned and dropped as it is read
+    '''
+    chunks = iter(chunks)
+    # one [key, expecting a key] per enclosing object, None per enclosing array
+    stack = []
+    data = b""
+    # where scanning resumes, where the value at path starts, where the key being read starts
+    pos = 0
+    start = None
+    key = None
+    in_string = False
+
+    for chunk in chunks:
+        keep = min(p for p in (pos, start, key) if p != None)
+        data = data[keep:] + chunk
+        pos -= keep
+        start = start - keep if start != None else None
+        key = key - keep if key != None else None
+
+        while True:
+            if in_string:
+                pos = JSON_STRING_REGEX.match(data, pos).end()
+                if pos == len(data) or data[pos:pos+1] == b"\\":
+                    # read on with the next chunk
+                    break
+                pos += 1
+                in_string = False
+                if key != None:
+                    stack[-1][0] = json.loads(data[key:pos])
+                    key = None
+                continue
+
+            if len(stack) > len(path):
+                # below path only brackets matter
+                pos = JSON_SKIP_REGEX.match(data, pos).end()
+
+            m = JSON_TOKEN_REGEX.search(data, pos)
+            if m == None:
+                pos = len(data)
                 break
-        if folder == haystack:
-            results.append((folder, fn))
+            pos = m.end()
+            token = m.group()
+            top = stack[-1] if len(stack) > 0 else None
+
+            if token == b'"':
+                in_string = True
+                if top != None and top[1]:
+                    # keys below path are never compared
+                    top[0] = None
+                    if len(stack) <= len(path):
+                        key = m.start()
+            elif token in (b"{", b"["):
+                if start == None and len(stack) == len(path) and [f[0] if f != None else None for f in stack] == path:
+                    start = m.start()
+                stack.append([None, True] if token == b"{" else None)
+            elif token in (b"}", b"]"):
+                stack.pop()
+                if start != None and len(stack) == len(path):
+                    value = json.loads(data[start:pos])
+                    # the writer must not block on a full pipe
+                    for chunk in chunks:
+                        pass
+                    return value
+            elif top != None:
+                # after a colon comes the value, after a comma the next key
+                top[1] = token == b","
+
+    return None
+
+def run_json(cmd, path, env=os.environ, raise_exception_on_fail=False):
+    '''
+    like run(), but returns the value at path of the JSON document printed by cmd instead of its output,
+    read as it is printed. The rest of the document is never held in memory
+    '''
+    proc = Popen([cmd], stdout=PIPE, stderr=PIPE, shell=True, env=env)
+
+    # read concurrently, a full stderr pipe would block cmd
+    err = []
+    reader = threading.Thread(target=lambda: err.append(proc.stderr.read()))
+    reader.start()
+
+    chunks = iter(lambda: proc.stdout.read(1 << 16), b"")
+    try:
+        value = json_member(chunks, path)
+    finally:
+        for chunk in chunks:
+            pass
+        reader.join()
+        proc.wait()
 
-    for (folder, fn) in results: 
-        debug ((folder, fn))
-        yield (folder, fn)
+    err = err[0].decode('utf-8', errors='replace')
+    exitcode = int(proc.returncode)
 
-def flatwalk(path):
-    for (folder, b, c) in os.walk(path):
-        for fn in c:
-            yield (folder, fn)
+    if raise_exception_on_fail and exitcode != 0:
+        raise Exception("Running {} resulted in return code {}, below is stderr: \n {}".format(cmd, exitcode, err))
+
+    return (value, err, exitcode)
+
+def toposort(nodes, deps):
+    '''
+    returns nodes sorted such that every node comes after the nodes it depends on,
+    ties are broken using the original order of nodes
+    '''
+    out = []
+    run_dag(nodes, deps, lambda n: out.append(n) or 0)
+
+    if len(out) != len(nodes):
+        cycle = [n for n in nodes if n not in out]
+        raise BundleException("ERROR: circular dependency between {}".format(", ".join(cycle)))
+
+    return out
+
+def reverse_deps(deps):
+    # a -> b becomes b -> a, e.g. for destroying components in the opposite order
+    out = OrderedDict((n, set()) for n in deps.keys())
+    for n, needs in deps.items():
+        for d in needs:
+            out[d].add(n)
+    return out
+
+def run_dag(nodes, deps, job, parallelism=1):
+    '''
+    runs job(node) for every node, a node is only started once all of the nodes it depends
+    on have returned 0. When a job fails, the nodes that depend on it (directly or not)
+    are skipped, unrelated branches carry on.
+
+    returns an OrderedDict of node -> return code, None for skipped nodes
+    '''
+    index = {n: i for i, n in enumerate(nodes)}
+    dependents = {n: [] for n in nodes}
+    waiting = {}
+    for n in nodes:
+        waiting[n] = len(deps.get(n, ()))
+        for d in deps.get(n, ()):
+            dependents[d].append(n)
+
+    results = OrderedDict((n, None) for n in nodes)
+    ready = [index[n] for n in nodes if waiting[n] == 0]
+    heapq.heapify(ready)
+
+    def finished(n, retcode):
+        results[n] = retcode
+        if retcode == 0:
+            for m in dependents[n]:
+                waiting[m] -= 1
+                if waiting[m] == 0:
+                    heapq.heappush(ready, index[m])
+
+    if parallelism <= 1:
+        while ready:
+            n = nodes[heapq.heappop(ready)]
+            finished(n, job(n))
+        return results
+
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        running = {}
+        while ready or running:
+            while ready and len(running) < parallelism:
+                n = nodes[heapq.heappop(ready)]
+                running[pool.submit(job, n)] = n
+
+            done, pending = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                finished(running.pop(f), f.result())
+
+    return results
+
+# libyaml bindings are much faster at parsing, when pyyaml was built with them
+YAML_LOADER = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+# path -> ((mtime, size), document), yml files parsed during this run
+yml_cache = {}
+
+def load_yml(path):
+    '''
+    parsed content of a yml file, each file is only parsed once per run unless it changes on disk.
+    The document is shared between callers and must not be modified
+    '''
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    cached = yml_cache.get(path)
+    if cached == None or cached[0] != stamp:
+        with open(path, 'r') as fh:
+            cached = (stamp, yaml.load(fh, Loader=YAML_LOADER))
+        yml_cache[path] = cached
+
+    return cached[1]
+
+# never walked into, in addition to the tb_ignore list of project.yml and the patterns in .tbignore
+IGNORE_DIRS = [".git", ".terraform", ".terragrunt-cache"]
+
+def load_ignore_patterns(root):
+    patterns = list(IGNORE_DIRS)
 
-def dir_is_git_repo(dir):
     try:
-        repo = Repo(dir)
-        return True
+        d = load_yml("{}/project.yml".format(root))
+        if type(d) == dict and type(d.get("tb_ignore")) == list:
+            patterns += [str(p) for p in d["tb_ignore"]]
+    except (OSError, IOError):
+        pass
 
-    except InvalidGitRepositoryError:
+    try:
+        with open("{}/.tbignore".format(root), 'r') as fh:
+            for line in fh:
+                line = line.strip()
+                if line != "" and line[0] != "#":
+                    patterns.append(line)
+    except (OSError, IOError):
         pass
 
+    return patterns
+
+def pinned_versions(root):
+    '''
+    name -> version of the binaries pinned by terraform_version and terragrunt_version in project.yml
+    '''
+    pins = {}
+    try:
+        d = load_yml("{}/project.yml".format(root))
+    except (OSError, IOError):
+        return pins
+
+    if type(d) == dict:
+        for name in ("terraform", "terragrunt"):
+            v = d.get("{}_version".format(name))
+            if v != None:
+                # terragrunt releases are tagged v1.2.3, terraform ones 1.2.3
+                v = str(v).lstrip("v")
+                if name == "terragrunt":
+                    v = "v" + v
+                pins[name] = v
+
+    return pins
+
+def is_ignored(path, patterns):
+    # path is relative to the project root, patterns match either its basename or the whole path
+    name = os.path.basename(path)
+    for p in patterns:
+        p = p.rstrip("/")
+        if fnmatch.fnmatch(name, p) or fnmatch.fnmatch(path, p):
+            return True
     return False
 
+def walk(path, ignore=IGNORE_DIRS, base=None):
+    # os.walk() which never enters ignored directories and skips ignored files
+    if base == None:
+        base = path
+
+    for (folder, dirs, files) in os.walk(path):
+        rel = os.path.relpath(folder, base)
+        dirs[:] = sorted([d for d in dirs if not is_ignored(os.path.normpath(os.path.join(rel, d)), ignore)])
+        files = sorted([f for f in files if not is_ignored(os.path.normpath(os.path.join(rel, f)), ignore)])
+        yield (folder, dirs, files)
+
+def flatwalk(path, ignore=IGNORE_DIRS, base=None):
+    for (folder, b, c) in walk(path, ignore, base):
+        for fn in c:
+            yield (folder, fn)
+
+def dir_is_git_repo(dir):
+    # a .git directory, or a .git file for worktrees and submodules, no need to open the repository
+    return os.path.exists(os.path.join(dir, ".git"))
+
 def git_rootdir(dir="."):
     if dir_is_git_repo(dir):
         return dir
@@ -125,130 +449,229 @@ def git_rootdir(dir="."):
             # not a git repository
             return None
 
-def git_check(wdir='.'):
-    
+def git_status(git_root):
+    '''
+    the local branches, their upstream and how far ahead and behind it they are, from a single git call.
+    Unlike git status, the working tree is not scanned. Returns {"branch": current branch, "branches": {...}},
+    branch is None on a detached head, upstream is None when a branch does not track one
+    '''
+    fmt = "%(HEAD)|%(refname:short)|%(upstream:short)|%(upstream:track,nobracket)"
+    (out, err, exitcode) = run("git -C \"{}\" for-each-ref --format=\"{}\" refs/heads".format(git_root, fmt), raise_exception_on_fail=True)
+
+    status = {"branch": None, "branches": {}}
+    for line in out.split("\n"):
+        parts = line.split("|")
+        if len(parts) != 4:
+            continue
+
+        (head, name, upstream, track) = parts
+        ahead = re.search(r"ahead (\d+)", track)
+        behind = re.search(r"behind (\d+)", track)
+        status["branches"][name] = {
+            "upstream": upstream if upstream != "" else None,
+            "ahead": int(ahead.group(1)) if ahead else 0,
+            "behind": int(behind.group(1)) if behind else 0
+        }
+        if head == "*":
+            status["branch"] = name
+
+    return status
+
+def ahead_behind(git_root, left, right):
+    # number of commits in left and not in right, and in right and not in left. None when a ref does not exist
+    command = "git -C \"{}\" rev-list --left-right --count \"{}...{}\"".format(git_root, left, right)
+    (out, err, exitcode) = run(command)
+    if exitcode != 0:
+        return None
+
+    out = out.strip().split("\t")
+    return (int(out[0]), int(out[-1]))
+
+def git_changes(dir="."):
+    '''
+    absolute paths of the uncommitted files below dir. Untracked directories are not listed file by file,
+    they are reported once, their path ending with a /
+    '''
+    git_root = git_rootdir(dir)
+    if git_root == None:
+        return []
+
+    (out, err, exitcode) = run("git -C \"{}\" status --porcelain -z --untracked-files=normal -- .".format(dir), raise_exception_on_fail=True)
+
+    # porcelain paths are relative to the root of the repository
+    git_root = os.path.abspath(git_root)
+    changes = []
+    entries = out.split("\0")
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if len(entry) < 4:
+            continue
+        if entry[0] in "RC":
+            # followed by the path the file was renamed or copied from
+            i += 1
+
+        # untracked directories keep their trailing /
+        changes.append(os.path.join(git_root, entry[3:]))
+
+    return changes
+
+def git_fetch(git_root, background=False):
+    '''
+    fetches all the remotes, concurrently. In the background, returns the running fetch without waiting for it
+    '''
+    cmd = ["git", "-C", git_root, "fetch", "--all", "--quiet", "--jobs={}".format(os.cpu_count() or 1)]
+    if background:
+        # detached, so that the fetch outlives short commands
+        return Popen(cmd, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, start_new_session=True)
+
+    (out, err, exitcode) = run(" ".join('"{}"'.format(c) for c in cmd))
+    if exitcode != 0:
+        log("WARNING: git fetch failed, the remote branches may be out of date: {}".format(err.strip()))
+    return None
+
+def git_check(wdir='.', fetch_interval=None, background=None):
+    '''
+    remotes are fetched when the last fetch is more than fetch_interval seconds old, never when it is
+    negative. In the background, the verdict is based on the refs of the previous fetch
+    '''
+
     git_root = git_rootdir(wdir)
 
     if git_root == None:
         return 0
 
-    f = "{}/.git/FETCH_HEAD".format(os.path.abspath(git_root))
-    
+    if fetch_interval == None:
+        fetch_interval = int(os.getenv('TB_GIT_FETCH_INTERVAL', 60))
+
+    if background == None:
+        background = os.getenv('TB_GIT_FETCH_BACKGROUND', 'n')[0].lower() in ['y', 't', '1']
+
+    git_root = os.path.abspath(git_root)
+    f = "{}/.git/FETCH_HEAD".format(git_root)
+
     if os.path.isfile(f):
         '''
          make sure this is not a freshly cloned repo with no FETCH_HEAD
         '''
-        last_fetch = int(os.stat(f).st_mtime)
-        diff = int(time.time() - last_fetch)
+        last_fetch = os.stat(f).st_mtime
+        stale = time.time() - last_fetch > fetch_interval
     else:
         # if the repo is a fresh clone, there is no FETCH_HEAD
-        # so set time diff to more than a minute to force a fetch
-        diff = 61
-        
-    repo = Repo(git_root)
+        stale = True
 
-    assert not repo.bare
+    if fetch_interval >= 0 and stale:
+        if not background:
+            git_fetch(git_root)
+        else:
+            # a fetch already started has not updated FETCH_HEAD yet
+            cache = Cache("git")
+            pending = Cache.key("fetch", git_root)
+            if cache.get(pending, ttl=fetch_interval) == None:
+                cache.set(pending, True)
+                git_fetch(git_root, background=True)
 
-    remote_names = []
-    
-    # fetch at most once per minute
-    for r in repo.remotes:
-        remote_names.append(r.name)
-        if diff > 60:
-            remote = Remote(repo, r.name)
-            remote.fetch()
-        
-    # check what branch we're on
-    branch = repo.active_branch.name
-        
-    origin_branch = None
-    for ref in repo.git.branch('-r').split('\n'):
-        for rn in remote_names:
-            if "{}/{}".format(rn, branch) in ref:
-                origin_branch = ref.strip()
-                break
-        
-        
-    if origin_branch == None:
+    status = git_status(git_root)
+    branch = status["branch"]
+
+    if branch == None or status["branches"][branch]["upstream"] == None:
         # no remote branch to compare to
         return 0
-        
-    # check if local branch is ahead and /or behind remote branch
-    command = "git -C {} rev-list --left-right --count \"{}...{}\"".format(git_root, branch, origin_branch)
-    #print command
-    (ahead_behind, err, exitcode) = run(command, raise_exception_on_fail=True)
-    ahead_behind = ahead_behind.strip().split("\t")
-    ahead = int(ahead_behind[0])
-    behind = int(ahead_behind.pop())
-    
-    if behind > 0:
+
+    if status["branches"][branch]["behind"] > 0:
         sys.stderr.write("")
         sys.stderr.write("GIT ERROR: You are on branch {} and are behind the remote.  Please git pull and/or merge before proceeding.  Below is a git status:".format(branch))
         sys.stderr.write("")
-        (status, err, exitcode) = run("git -C {} status ".format(git_root))
-        sys.stderr.write(status)
+        (out, err, exitcode) = run("git -C \"{}\" status ".format(git_root))
+        sys.stderr.write(out)
         sys.stderr.write("")
         return(-1)
-    else:
-    
-        TB_GIT_DEFAULT_BRANCH = os.getenv('TB_GIT_DEFAULT_BRANCH', 'master')
-        
-        if branch != TB_GIT_DEFAULT_BRANCH:
+
+    TB_GIT_DEFAULT_BRANCH = os.getenv('TB_GIT_DEFAULT_BRANCH', 'master')
+
+    if branch != TB_GIT_DEFAULT_BRANCH:
+        '''
+            in this case assume we're on a feature branch
+            if the FB is behind the default branch of its remote then issue a warning
+        '''
+        origin = status["branches"][branch]["upstream"].split("/")[0]
+        counts = ahead_behind(git_root, branch, "{}/{}".format(origin, TB_GIT_DEFAULT_BRANCH))
+        if counts == None:
             '''
-                in this case assume we're on a feature branch
-                if the FB is behind master then issue a warning
+            In this case the remote does not contain TB_GIT_DEFAULT_BRANCH, so I guess assume that we're
+            on the default branch afterall and that we're up to date persuant to the above code
             '''
-            command = "git -C {} branch -vv | grep {} ".format(git_root, TB_GIT_DEFAULT_BRANCH)
-            (origin_master, err, exitcode) = run(command)
-            if exitcode != 0:
-                '''
-                In this case the git repo does not contain TB_GIT_DEFAULT_BRANCH, so I guess assume that we're 
-                on the default branch afterall and that we're up to date persuant to the above code
-                '''
-                return 0
-            
-            for line in origin_master.split("\n"):
-                if line.strip().startswith(TB_GIT_DEFAULT_BRANCH):
-                    origin = line.strip().split('[')[1].split('/')[0]
-
-            assert origin != None
+            return 0
 
-            command = "git -C {} rev-list --left-right --count \"{}...{}/{}\"".format(git_root, branch, origin, TB_GIT_DEFAULT_BRANCH)
-            (ahead_behind, err, exitcode) = run(command)
-            ahead_behind = ahead_behind.strip().split("\t")
-            ahead = int(ahead_behind[0])
-            behind = int(ahead_behind.pop())
+        (ahead, behind) = counts
 
-            command = "git -C {} rev-list --left-right --count \"{}...{}\"".format(git_root, branch, TB_GIT_DEFAULT_BRANCH)
-            (ahead_behind, err, exitcode) = run(command)
-            ahead_behind = ahead_behind.strip().split("\t")
-            local_ahead = int(ahead_behind[0])
-            local_behind = int(ahead_behind.pop())
+        if behind > 0:
+            sys.stderr.write("")
+            sys.stderr.write("GIT WARNING: Your branch, {}, is {} commit(s) behind {}/{}.\n".format(branch, behind, origin, TB_GIT_DEFAULT_BRANCH))
+            sys.stderr.write("This action may clobber new changes that have occurred in {} since your branch was made.\n".format(TB_GIT_DEFAULT_BRANCH))
+            sys.stderr.write("It is recommended that you stop now and merge or rebase from {}\n".format(TB_GIT_DEFAULT_BRANCH))
+            sys.stderr.write("\n")
 
-            
-            if behind > 0:
+            default = status["branches"].get(TB_GIT_DEFAULT_BRANCH)
+            if default != None and default["behind"] > 0:
                 sys.stderr.write("")
-                sys.stderr.write("GIT WARNING: Your branch, {}, is {} commit(s) behind {}/{}.\n".format(branch, behind, origin, TB_GIT_DEFAULT_BRANCH))
-                sys.stderr.write("This action may clobber new changes that have occurred in {} since your branch was made.\n".format(TB_GIT_DEFAULT_BRANCH))
-                sys.stderr.write("It is recommended that you stop now and merge or rebase from {}\n".format(TB_GIT_DEFAULT_BRANCH))
+                sys.stderr.write("INFO: your local {} branch is not up to date with {}/{}\n".format(TB_GIT_DEFAULT_BRANCH, origin, TB_GIT_DEFAULT_BRANCH))
+                sys.stderr.write("HINT:")
+                sys.stderr.write("git checkout {} ; git pull ; git checkout {}\n".format(TB_GIT_DEFAULT_BRANCH, branch))
                 sys.stderr.write("\n")
-                
-                if ahead != local_ahead or behind != local_behind:
-                    sys.stderr.write("")
-                    sys.stderr.write("INFO: your local {} branch is not up to date with {}/{}\n".format(TB_GIT_DEFAULT_BRANCH, origin, TB_GIT_DEFAULT_BRANCH))
-                    sys.stderr.write("HINT:")
-                    sys.stderr.write("git checkout {} ; git pull ; git checkout {}\n".format(TB_GIT_DEFAULT_BRANCH, branch))
-                    sys.stderr.write("\n")
-                    
-                answer = raw_input("Do you want to continue anyway? [y/N]? ").lower()
-                
-                if answer != 'y':
-                    log("")
-                    log("Aborting due to user input")
-                    exit()
-            
-        return 0
 
+            answer = input("Do you want to continue anyway? [y/N]? ").lower()
+
+            if answer != 'y':
+                log("")
+                log("Aborting due to user input")
+                exit()
+
+    return 0
+
+def parse_version(v):
+    '''
+    (major, minor, patch) of a release version such as 1.2.3, None for anything else, e.g. rc, alpha, beta versions
+    '''
+    parts = v.lstrip("v").split(".")
+    if len(parts) != 3:
+        return None
+
+    try:
+        return tuple(int(p) for p in parts)
+    except ValueError:
+        return None
+
+def latest_version(versions):
+    # the highest release version, in a single pass
+    latest = None
+    latest_parsed = None
+    for v in versions:
+        parsed = parse_version(v)
+        if parsed != None and (latest_parsed == None or parsed > latest_parsed):
+            latest = v
+            latest_parsed = parsed
+
+    return latest
+
+# keys of the versions object of a release index, e.g. "1.2.3": {
+INDEX_VERSION_REGEX = re.compile(rb'"([0-9][^"]*)"\s*:\s*\{')
+
+def scan_versions(chunks, overlap=64):
+    '''
+    the versions listed in a release index such as https://releases.hashicorp.com/terraform/index.json,
+    read chunk by chunk, the document is never loaded as a whole
+    '''
+    tail = b""
+    for chunk in chunks:
+        data = tail + chunk
+        end = 0
+        for match in INDEX_VERSION_REGEX.finditer(data):
+            yield match.group(1).decode('utf-8', errors='replace')
+            end = match.end()
+        # a key may be cut between two chunks
+        tail = data[max(end, len(data) - overlap):]
 
 class NoRemoteState(Exception):
     pass
@@ -256,29 +679,188 @@ class NoRemoteState(Exception):
 class RemoteStateKeyNotFound(Exception):
     pass
 
+def read_local_state(config, component):
+    # outputs from the state file of a local backend, relative paths are relative to the component
+    path = os.path.join(component, str(config.get("path", "terraform.tfstate")))
+    try:
+        with open(path, 'rb') as fh:
+            outputs = json_member(iter(lambda: fh.read(1 << 16), b""), ["outputs"])
+    except (OSError, ValueError):
+        return None
+
+    if type(outputs) != dict:
+        return None
+
+    return outputs
+
+# backend name -> function(config, component) returning the outputs found in the state, or None
+# when they cannot be read that way. Other backends are read by terragrunt
+STATE_READERS = {
+    "local": read_local_state,
+}
+
+def collect_outputs(wt, components, as_json=False, parallelism=8, captured={}):
+    '''
+    runs show for every component, concurrently. Returns (component, outputs, err, exitcode) in the order of
+    components, outputs being the outputs object with as_json, the lines printed after "Outputs:" otherwise.
+    The components in captured, component -> lines already printed after "Outputs:", are not shown again
+    '''
+    # get_command() adds options to wt, commands are built before any of them runs
+    commands = OrderedDict((c, wt.get_command(command="show", wdir=c)) for c in components if as_json or c not in captured)
+
+    def show(component):
+        if component not in commands:
+            return (component, captured[component], "", 0)
+
+        if as_json:
+            (outputs, err, exitcode) = run_json(commands[component], ["values", "outputs"])
+            if exitcode == 0:
+                wt.source_updated(component)
+            return (component, outputs, err, exitcode)
+
+        (out, err, exitcode) = run(commands[component])
+        debug((out, err, exitcode))
+        if exitcode == 0:
+            wt.source_updated(component)
+
+        lines = []
+        p = False
+        for line in out.split("\n"):
+            if p:
+                lines.append("    {}".format(line))
+            if line.strip().startswith('Outputs:'):
+                p = True
+        return (component, lines, err, exitcode)
+
+    if len(commands) > 1:
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(commands))) as pool:
+            return list(pool.map(show, components))
+    return [show(c) for c in components]
+
 class RemoteStates():
+    '''
+    outputs of components, fetched once per run. Outputs are also kept on disk for
+    TB_REMOTE_STATE_TTL seconds, when set
+    '''
 
-    def __init__(self):
+    def __init__(self, ttl=None):
+        if ttl == None:
+            ttl = int(os.getenv('TB_REMOTE_STATE_TTL', 0))
+
+        self.ttl = ttl
         self.components = {}
 
-    def fetch(self, component):
-        if component not in self.components.values():
-            u = Utils()
-            wt = WrapTerragrunt(terraform_path=u.terraform_path, terragrunt_path=u.terragrunt_path)
+    def show(self, component, u=None):
+        cache = Cache("remotestate")
+        key = Cache.key(os.path.abspath(component))
+        if self.ttl > 0:
+            outputs = cache.get(key, ttl=self.ttl)
+            if outputs != None:
+                return outputs
+
+        outputs = self.read_backend(component)
+        if outputs == None:
+            outputs = self.terragrunt_outputs(component, u)
+
+        if self.ttl > 0:
+            cache.set(key, outputs)
+
+        return outputs
+
+    def read_backend(self, component):
+        '''
+        outputs read straight from the state described by the remote_state block of the
+        component's terragrunt.hcl, None when its backend has no reader in STATE_READERS
+        '''
+        try:
+            with open("{}/terragrunt.hcl".format(component), 'r') as fh:
+                remote_state = hcl.load(fh)["remote_state"]
+            reader = STATE_READERS[remote_state["backend"]]
+        except Exception:
+            return None
+
+        config = remote_state.get("config", {})
+        if type(config) != dict:
+            return None
+
+        debug("reading {} backend of {}".format(remote_state["backend"], component))
+        return reader(config, component)
+
+    def terragrunt_outputs(self, component, u=None):
+        # terragrunt output is lighter than terragrunt show, the latter is only needed to tell why there are no outputs
+        if u == None:
+            u = Utils.for_dir(component)
+
+        try:
+            u.install_pinned()
+        except DownloadException as e:
+            raise NoRemoteState("ERROR: could not read the remote state of component {}\n{}".format(component, e))
+
+        wt = WrapTerragrunt(terraform_path=u.terraform_path, terragrunt_path=u.terragrunt_path)
+        wt.set_option('-json')
+        wt.set_option('-no-color')
+        (out, err, exitcode) = run(wt.get_command(command="output", wdir=component))
+        if exitcode == 0:
+            wt.source_updated(component)
+            try:
+                outputs = json.loads(out)
+                if type(outputs) == dict and len(outputs) > 0:
+                    return outputs
+            except ValueError:
+                pass
+
+        wt = WrapTerragrunt(terraform_path=u.terraform_path, terragrunt_path=u.terragrunt_path)
+        wt.set_option('-json')
+        wt.set_option('-no-color')
+        # the whole state, only its outputs are parsed
+        (outputs, err, exitcode) = run_json(wt.get_command(command="show", wdir=component), ["values", "outputs"])
+        if exitcode != 0:
+            raise NoRemoteState("ERROR: could not read the remote state of component {}\n{}".format(component, err))
+        wt.source_updated(component)
+
+        if outputs == None:
+            raise NoRemoteState("ERROR: No remote state found for component {}".format(component))
+        return outputs
+
+    def fetch(self, components, parallelism=8):
+        '''
+        fetches the outputs of the components not fetched yet, concurrently. When some of them
+        fail, the others are still kept and the first error is raised
+        '''
+        missing = []
+        for c in components:
+            if c not in self.components and c not in missing:
+                missing.append(c)
+
+        if len(missing) == 0:
+            return
+
+        u = Utils.for_dir(missing[0])
+        def show(component):
+            try:
+                return (self.show(component, u), None)
+            except Exception as e:
+                return (None, e)
+
+        if len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=min(parallelism, len(missing))) as pool:
+                results = list(pool.map(show, missing))
+        else:
+            results = [show(c) for c in missing]
+
+        errors = []
+        for component, (outputs, e) in zip(missing, results):
+            if e != None:
+                errors.append(e)
+            else:
+                self.components[component] = outputs
+
+        if len(errors) > 0:
+            raise errors[0]
 
-            wt.set_option('-json')
-            wt.set_option('-no-color')
-            (out, err, exitcode) = run(wt.get_command(command="show", wdir=component))
-            if exitcode == 0:
-                d = json.loads(out)
-                try:
-                    self.components[component] = d["values"]["outputs"]
-                except KeyError:
-                    raise NoRemoteState("ERROR: No remote state found for component {}".format(component))
-  
     def value(self, component, key):
-        self.fetch(component)
-        
+        self.fetch([component])
+
         try:
             value = self.components[component][key]["value"]
         except KeyError:
@@ -301,6 +883,9 @@ class WrapTerragrunt():
         self.tf_bin = terraform_path
         self.terragrunt_options = []
         self.quiet = False
+        self.source_update = None
+        # wdir -> source of the last command built for it, recorded once that command succeeded
+        self.sources = {}
 
 
     def get_cache_dir(ymlfile, package_name):
@@ -314,6 +899,49 @@ class WrapTerragrunt():
     def set_quiet(self, which=True):
         self.quiet = which
 
+    def set_source_update(self, which=True):
+        # True forces --terragrunt-source-update, False never sets it, None only sets it when the source changed
+        self.source_update = which
+
+    def needs_source_update(self, wdir):
+        '''
+        True when the terraform source of the component's terragrunt.hcl changed since the last command
+        that ran successfully for it, see source_updated()
+        '''
+        if self.source_update != None:
+            return self.source_update
+
+        try:
+            with open("{}/terragrunt.hcl".format(wdir), 'r') as fh:
+                d = hcl.load(fh)
+        except (OSError, IOError):
+            return False
+        except Exception:
+            # cannot tell which source is used, let terragrunt refresh it
+            return True
+
+        try:
+            source = str(d["terraform"]["source"])
+        except (KeyError, TypeError):
+            return False
+
+        cache = Cache("sources")
+        key = Cache.key(os.path.abspath(wdir))
+        if cache.get(key) == source:
+            return False
+
+        self.sources[wdir] = source
+        return True
+
+    def source_updated(self, wdir):
+        '''
+        records the source of the command built for wdir in the "sources" cache, to be called once it
+        returned 0. A failed run leaves it out, the next command updates the source again
+        '''
+        source = self.sources.pop(wdir, None)
+        if source != None:
+            Cache("sources").set(Cache.key(os.path.abspath(wdir)), source)
+
     def get_download_dir(self):
         return os.getenv('TERRAGRUNT_DOWNLOAD_DIR',"~/.terragrunt")
 
@@ -331,7 +959,11 @@ class WrapTerragrunt():
         else:
             var_file = ""
 
-        cmd = "{} {} --terragrunt-source-update --terragrunt-working-dir {} {} {} {} ".format(self.tg_bin, command, wdir, var_file, " ".join(set(self.terragrunt_options)), " ".join(extra_args))
+        source_update = ""
+        if self.needs_source_update(wdir):
+            source_update = "--terragrunt-source-update"
+
+        cmd = "{} {} {} --terragrunt-working-dir {} {} {} {} ".format(self.tg_bin, command, source_update, wdir, var_file, " ".join(set(self.terragrunt_options)), " ".join(extra_args))
         
         if self.quiet:
             cmd += " > /dev/null 2>&1 "
@@ -340,12 +972,263 @@ class WrapTerragrunt():
         return cmd
 
 
+VAR_REGEX = re.compile(r"\$\{(.+?)\}")
+
+class Interpolator():
+    '''
+    substitutes ${name} tokens in a single scan of the text. Names are looked up
+    in vars first, then in env vars. Unknown names are left as is.
+    '''
+
+    def __init__(self, vars, env=os.environ):
+        self.vars = vars
+        self.lookup = ChainMap(vars, env)
+
+    def _replace(self, match):
+        try:
+            return str(self.lookup[match.group(1)])
+        except KeyError:
+            return match.group()
+
+    def render(self, s):
+        if "${" not in s:
+            return s
+        return VAR_REGEX.sub(self._replace, s)
+
+    def resolve(self):
+        '''
+        substitutes references between vars in place, each var is rendered once,
+        after the vars it refers to. Returns the circular references found, as lists of var names
+        '''
+        done = set()
+        visiting = []
+        cycles = []
+
+        def visit(k):
+            if k in done:
+                return
+            if k in visiting:
+                cycles.append(visiting[visiting.index(k):] + [k])
+                return
+
+            v = self.vars[k]
+            if type(v) is str and "${" in v:
+                visiting.append(k)
+                for name in VAR_REGEX.findall(v):
+                    if name in self.vars:
+                        visit(name)
+                visiting.pop()
+                self.vars[k] = self.render(v)
+
+            done.add(k)
+
+        for k in list(self.vars.keys()):
+            visit(k)
+
+        return cycles
+
 class ErrorParsingYmlVars(Exception):
     pass
 
 class HclParseException(Exception):
     pass
 
+class BundleException(Exception):
+    pass
+
+class DownloadException(Exception):
+    pass
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024*1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class Cache():
+    '''
+    json documents stored under <conf_dir>/cache/<namespace>, one file per key
+    '''
+
+    def __init__(self, namespace):
+        self.dir = "{}/cache/{}".format(Utils.conf_dir, namespace)
+
+    @staticmethod
+    def key(*parts):
+        h = hashlib.sha256()
+        for p in parts:
+            if type(p) is not bytes:
+                p = str(p).encode('utf-8')
+            h.update(p)
+            h.update(b'\0')
+        return h.hexdigest()
+
+    @staticmethod
+    def clear():
+        shutil.rmtree("{}/cache".format(Utils.conf_dir), ignore_errors=True)
+
+    def path(self, key):
+        return "{}/{}.json".format(self.dir, key)
+
+    def get(self, key, ttl=None):
+        # returns None when key is not cached, or was cached more than ttl seconds ago
+        try:
+            if ttl != None and time.time() - os.stat(self.path(key)).st_mtime > ttl:
+                return None
+            with open(self.path(key), 'r') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir, exist_ok=True)
+
+        # write then rename, concurrent readers never see a partial file
+        tmp = "{}.{}.tmp".format(self.path(key), os.getpid())
+        with open(tmp, 'w') as fh:
+            json.dump(value, fh)
+        os.replace(tmp, self.path(key))
+
+class ProjectIndex():
+    '''
+    files of a directory tree, listed in a single walk and shared by every component of a run
+    '''
+
+    def __init__(self, root, ignore=IGNORE_DIRS, base=None):
+        self.root = os.path.abspath(root)
+        self.dirs = OrderedDict()
+        self.chains = {}
+
+        for (folder, dirs, files) in walk(self.root, ignore, base):
+            self.dirs[folder] = files
+
+    def covers(self, path):
+        path = os.path.abspath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def chain(self, dir, top):
+        '''
+        list of (folder, filename) for the files in top and in every directory below it, down to dir.
+        Chains are memoized, a directory reuses the chain of its parent
+        '''
+        dir = os.path.abspath(dir)
+        top = os.path.abspath(top)
+        key = (dir, top)
+
+        if key not in self.chains:
+            parent = os.path.dirname(dir)
+            if dir == top or parent == dir:
+                chain = []
+            else:
+                chain = list(self.chain(parent, top))
+
+            for fn in self.dirs.get(dir, []):
+                chain.append((dir, fn))
+
+            self.chains[key] = chain
+
+        return self.chains[key]
+
+def bigrams(s):
+    return Counter(s[i:i+2] for i in range(len(s) - 1))
+
+class Suggestions():
+    '''
+    the names that fuzz.ratio scores at least lim against a misspelled one, in the order they were given.
+    Names are indexed by their bigrams, only those sharing enough bigrams and letters with the miss are scored
+    '''
+
+    def __init__(self, names, lim=80):
+        self.lim = lim
+        self.names = []
+        self.grams = []
+        self.letters = []
+        self.lengths = {}
+        self.postings = {}
+        self.suggested = {}
+
+        for name in OrderedDict.fromkeys(names):
+            id = len(self.names)
+            self.names.append(name)
+            self.grams.append(bigrams(name))
+            self.letters.append(Counter(name))
+            self.lengths.setdefault(len(name), []).append(id)
+            for gram in self.grams[id]:
+                self.postings.setdefault(gram, []).append(id)
+
+    def possible(self, shared, a, b, letters=None):
+        '''
+        whether two strings of lengths a and b sharing that many bigrams and letters can reach lim.
+        The ratio is 2 * matching characters / (a + b), matching characters are at most their longest
+        common subsequence L, and L - 1 - (a - L) - (b - L) of its bigrams are contiguous in both strings
+        '''
+        total = a + b
+        if total == 0:
+            return False
+        common = min(a, b, (shared + 1 + total) // 3)
+        if letters != None:
+            common = min(common, letters)
+        return round(200.0 * common / total) >= self.lim
+
+    def get(self, miss):
+        if miss not in self.suggested:
+            a = len(miss)
+            grams = bigrams(miss)
+            candidates = set()
+
+            # the fewest bigrams a name must share with the miss, very short names may share none
+            need = None
+            for (length, ids) in self.lengths.items():
+                if self.possible(0, a, length):
+                    candidates.update(ids)
+                    continue
+                for count in range(1, a):
+                    if self.possible(count, a, length):
+                        if need == None or count < need:
+                            need = count
+                        break
+
+            # shared bigrams of the names that can reach lim. Such a name is in the postings of the rarest
+            # bigrams, all but need - 1 of them, the other bigrams only count for the names found so far
+            shared = {}
+            if need != None:
+                budget = sum(grams.values()) - need + 1
+                for gram in sorted(grams, key=lambda g: len(self.postings.get(g, []))):
+                    n = grams[gram]
+                    posting = self.postings.get(gram, [])
+                    if budget > 0:
+                        for id in posting:
+                            shared[id] = shared.get(id, 0) + min(n, self.grams[id][gram])
+                        budget -= n
+                    elif len(posting) < len(shared):
+                        for id in posting:
+                            if id in shared:
+                                shared[id] += min(n, self.grams[id][gram])
+                    else:
+                        for id in shared:
+                            if gram in self.grams[id]:
+                                shared[id] += min(n, self.grams[id][gram])
+
+            candidates.update(id for (id, n) in shared.items() if self.possible(n, a, len(self.names[id])))
+
+            # matching characters are also at most the letters both have
+            letters = Counter(miss)
+            near = []
+            for id in candidates:
+                b = len(self.names[id])
+                common = sum(min(n, self.letters[id][c]) for (c, n) in letters.items())
+                # the bigrams of the very short names were not counted, a is more than they can share
+                if not self.possible(shared.get(id, a), a, b, letters=common):
+                    continue
+                if fuzz.ratio(miss, self.names[id]) >= self.lim:
+                    near.append(id)
+
+            self.suggested[miss] = [self.names[id] for id in sorted(near)]
+
+        return self.suggested[miss]
+
 class Project():
 
     def __init__(self,
@@ -357,9 +1240,21 @@ class Project():
         self.inpattern=inpattern
         self.dir=dir
         self.vars=None
+        self.suggestions = None
+        self.out_string = None
         self.parse_messages = []
+        self.template_lines = []
 
         self.components = None
+        self.component_types = {}
+        self.component_order = {}
+        self.component_paths = []
+        self.bundles = {}
+        self.expanding = []
+        self.indexes = []
+        self.roots = {}
+        self.ignore = {}
+        self.layers = {}
         self.git_filtered = git_filtered
         self.conf_marker = conf_marker
         self.remotestates = None
@@ -367,29 +1262,35 @@ class Project():
     def set_dir(self, dir):
         self.dir=dir
         self.vars = None
+        self.suggestions = None
+        self.out_string = None
+        self.template_lines = []
 
     def check_hclt_file(self, path):
-        only_whitespace = True
-        with open(path, 'r') as lines:
-            for line in lines:    
-                #debug("##{}##".format(line.strip()))     
-                if line.strip() != "":
-                    only_whitespace = False
-                    break
-        #debug(only_whitespace)     
+        # a template is only parsed when its content has not been validated before
+        with open(path, 'r') as fh:
+            data = fh.read()
+
+        only_whitespace = data.strip() == ""
 
         if not only_whitespace:
-            with open(path, 'r') as fp:
+            cache = Cache("hclt")
+            key = Cache.key("hclt-v1", data)
+            if cache.get(key) == None:
                 try:
-                    obj = hcl.load(fp)
+                    obj = hcl.loads(data)
                 except:
                     raise HclParseException("FATAL: An error occurred while parsing {}\nPlease verify that this file is valid hcl syntax".format(path))
+                cache.set(key, True)
 
         return only_whitespace
 
     def check_parsed_file(self, require_remote_state_block=True):
         # this function makes sure that self.outstring contains a legit hcl file with a remote state config
-        obj = hcl.loads(self.out_string)
+        try:
+            obj = hcl.loads(self.out_string)
+        except ValueError as e:
+            raise HclParseException("FATAL: An error occurred while parsing {}\n{}".format(self.outfile, self.locate_error(str(e))))
 
         debug(obj)
         try:
@@ -400,6 +1301,19 @@ class Project():
 
         return True
 
+    def locate_error(self, msg):
+        # points a "Line N, ..." error of the rendered output to the template that line comes from
+        m = re.match(r"Line (\d+)", msg)
+        if m == None:
+            return msg
+
+        line = int(m.group(1))
+        for (filename, first) in reversed(self.template_lines):
+            if line >= first:
+                return "File {}, rendered line {}: {}".format(os.path.relpath(filename), line - first + 1, msg)
+
+        return msg
+
     def format_hclt_file(self, path):
         log("Formatting {}".format(path))
         only_whitespace = self.check_hclt_file(path)
@@ -424,6 +1338,12 @@ class Project():
         log("")
         
     def get_project_root(self, dir=".", fallback_to_git=True):
+        key = (dir, fallback_to_git)
+        if key not in self.roots:
+            self.roots[key] = self.find_project_root(dir, fallback_to_git)
+        return self.roots[key]
+
+    def find_project_root(self, dir=".", fallback_to_git=True):
         d = os.path.abspath(dir)
 
         if os.path.isfile("{}/{}".format(d, self.conf_marker)):
@@ -433,87 +1353,248 @@ class Project():
         
         oneup = os.path.abspath(dir+'/../')
         if oneup != "/":
-            return self.get_project_root(oneup, fallback_to_git)
+            return self.find_project_root(oneup, fallback_to_git)
         
         raise Exception("Could not find a project root directory")
 
+    def get_index(self, path):
+        # one walk per run, unless path lies outside of the trees already indexed
+        for index in self.indexes:
+            if index.covers(path):
+                return index
+
+        root = self.get_project_root(path)
+        index = ProjectIndex(path, self.get_ignore(root), base=root)
+        self.indexes.append(index)
+        return index
+
+    def get_ignore(self, root):
+        if root not in self.ignore:
+            self.ignore[root] = load_ignore_patterns(root)
+        return self.ignore[root]
+
+    def get_chain(self):
+        # (folder, filename) of the files in the component directory and its parents, up to the project root
+        project_root = self.get_project_root(self.dir)
+        return self.get_index(project_root).chain(self.dir, project_root)
+
+    def get_var_layer(self, dir, top):
+        '''
+        (vars, sources) loaded from the yml files in top and in every directory below it, down to dir,
+        sources being the file each var comes from. Layers are memoized, a directory starts from
+        the already merged layer of its parent. Layers are shared and must not be modified
+        '''
+        dir = os.path.abspath(dir)
+        top = os.path.abspath(top)
+        key = (dir, top)
+
+        if key not in self.layers:
+            parent = os.path.dirname(dir)
+            if dir == top or parent == dir:
+                vars, sources = {}, {}
+            else:
+                vars, sources = self.get_var_layer(parent, top)
+                vars, sources = dict(vars), dict(sources)
+
+            for fn in self.get_index(top).dirs.get(dir, []):
+                if fn.endswith('.yml'):
+                    path = '{}/{}'.format(dir, fn)
+                    d = load_yml(path)
+                    if type(d) == dict:
+                        for k,v in d.items():
+                            if type(v) in (str, int, float):
+                                vars[k] = v
+                                sources[k] = path
+
+            self.layers[key] = (vars, sources)
+
+        return self.layers[key]
+
    # def get_filtered_components(wdir, filter):
 
+    def get_changed_dirs(self):
+        '''
+        (changed, untracked) paths relative to the current directory: the directories holding uncommitted
+        files and all their parents, and the untracked directories. Ignored paths are left out
+        '''
+        root = os.path.abspath(self.get_project_root('.'))
+        ignore = self.get_ignore(self.get_project_root('.'))
+        changed = set()
+        untracked = set()
+
+        for path in git_changes('.'):
+            parts = os.path.relpath(path, root).split(os.sep)
+            if any(is_ignored("/".join(parts[:i+1]), ignore) for i in range(len(parts))):
+                continue
+
+            if path.endswith("/"):
+                d = os.path.relpath(path)
+                untracked.add(d)
+            else:
+                d = os.path.dirname(os.path.relpath(path))
+
+            while d not in ("", ".") and d not in changed:
+                changed.add(d)
+                d = os.path.dirname(d)
+
+        return (changed, untracked)
+
     def get_components(self, dir='.'):
         if self.components == None:
             self.components = []
-            filtered = []
             if self.git_filtered:
-                (out, err, exitcode) = run("git status -s -uall", raise_exception_on_fail=True)
-                for line in out.split("\n"):
-                    p = line.split(" ")[-1]
-                    if len(p) > 3:
-                        filtered.append(os.path.dirname(p))
-
-            for (dirpath, filename) in flatwalk('.'):
-                dirpath = dirpath[2:]
-                if filename in ['inputs.hclt', "bundle.yml"] and len(dirpath) > 0:
+                (changed, untracked) = self.get_changed_dirs()
+
+            # the index may cover the whole project, only the directories below the current one are listed
+            cwd = os.path.abspath('.')
+            index = self.get_index('.')
+            for (folder, filenames) in index.dirs.items():
+                if not folder.startswith(cwd + os.sep):
+                    continue
+                dirpath = os.path.relpath(folder)
+
+                for filename in filenames:
+                    if filename not in ['inputs.hclt', "bundle.yml"]:
+                        continue
+
                     which = "component"
                     if filename == "bundle.yml":
                         which = "bundle"
                     if self.git_filtered:
-                        match = False
-                        for f in filtered:
-                            if f.startswith(dirpath):
-                                match = True
-                                break
+                        # changes at or below the component, or the component lies in an untracked directory
+                        match = dirpath in changed
+                        d = dirpath
+                        while not match and d not in ("", "."):
+                            match = d in untracked
+                            d = os.path.dirname(d)
                         self.components.append((which, dirpath, match))
 
                     else:
                         self.components.append((which, dirpath, True))
-        
+
+            # path -> type, the first one found when a directory is both, and the paths sorted for prefix lookups
+            self.component_types = {}
+            for (which, c, match) in self.components:
+                self.component_types.setdefault(c, which)
+            self.component_order = dict((c, i) for (i, c) in enumerate(self.component_types))
+            self.component_paths = sorted(self.component_types)
+
         return self.components
     
 
 
     def component_type(self, component, dir='.'):
-        for which, c, match in self.get_components(dir=dir):
-            if c == component:
-                return which
+        self.get_components(dir=dir)
+        return self.component_types.get(os.path.normpath(component))
 
-        return None
+    def components_below(self, prefix):
+        # components and bundles whose path starts with prefix, in the order they were found
+        self.get_components()
+
+        found = []
+        for i in range(bisect.bisect_left(self.component_paths, prefix), len(self.component_paths)):
+            c = self.component_paths[i]
+            if not c.startswith(prefix):
+                break
+            found.append(c)
+
+        return sorted(found, key=lambda c: self.component_order[c])
 
 
     def get_bundle(self, wdir):
+        components, deps = self.get_bundle_graph(wdir)
+        return components
+
+    def get_bundle_graph(self, wdir):
+        '''
+        returns (components, deps), components being the flattened list of components of the bundle
+        and deps a dict of component -> set of components it depends on.
+
+        Without a depends_on section in bundle.yml, every entry of order depends on the previous one.
+        Bundles are expanded once per run, the result is shared and must not be modified
+        '''
+        key = os.path.normpath(wdir)
+
+        if key not in self.bundles:
+            if key in self.expanding:
+                cycle = self.expanding[self.expanding.index(key):] + [key]
+                raise BundleException("ERROR: bundles include each other: {}".format(" -> ".join(cycle)))
+
+            self.expanding.append(key)
+            try:
+                self.bundles[key] = self.expand_bundle(key)
+            finally:
+                self.expanding.pop()
+
+        return self.bundles[key]
+
+    def expand_bundle(self, wdir):
         components = []
+        deps = OrderedDict()
 
         if wdir[-1] == "*":
             debug("")
             debug("get_bundle wdir {}".format(wdir))
             wdir = os.path.relpath(wdir[0:-1])
-            for which, c, match in self.get_components():
-                if c.startswith(wdir):
-                    components.append(c)
+            for c in self.components_below(wdir):
+                components.append(c)
+                deps[c] = set()
 
-                    debug("get_bundle  {}".format(c))
+                debug("get_bundle  {}".format(c))
             debug("")
-            return components
+            return components, deps
 
         bundleyml = '{}/{}'.format(wdir, "bundle.yml")
 
         if not os.path.isfile(bundleyml):
-            return [wdir]
+            return [wdir], OrderedDict([(wdir, set())])
 
-        with open(bundleyml, 'r') as fh:
-            d = yaml.load(fh, Loader=yaml.FullLoader)
+        d = load_yml(bundleyml)
 
         order = d['order']
+        depends_on = d.get('depends_on', None)
 
+        entries = OrderedDict()
         if type(order) == list:
             for i in order:
-                component = "{}/{}".format(wdir, i)
+                component = os.path.normpath("{}/{}".format(wdir, i))
                 if self.component_type(component, wdir) == "component":
-                    components.append(component)
+                    sub, subdeps = [component], {component: set()}
+                elif str(i)[-1] != "*" and not os.path.isdir(component):
+                    raise BundleException("ERROR: {} order refers to \"{}\" which is not a directory".format(bundleyml, i))
                 else:
-                    for c in  self.get_bundle(component):
+                    sub, subdeps = self.get_bundle_graph(component)
+
+                entries[str(i)] = sub
+                for c in sub:
+                    if c not in deps:
                         components.append(c)
+                        deps[c] = set()
+                    deps[c] |= subdeps[c]
 
-        return components
+        if depends_on == None:
+            # components run one after the other, in order
+            for prev, c in zip(components, components[1:]):
+                deps[c].add(prev)
+
+        elif type(depends_on) == dict:
+            for entry, needs in depends_on.items():
+                if type(needs) != list:
+                    needs = [needs]
+                for n in [entry] + needs:
+                    if str(n) not in entries:
+                        raise BundleException("ERROR: {} depends_on refers to \"{}\" which is not in order".format(bundleyml, n))
+
+                for c in entries[str(entry)]:
+                    for n in needs:
+                        deps[c] |= set(entries[str(n)]) - set([c])
+
+            components = toposort(components, deps)
+
+        else:
+            raise BundleException("ERROR: depends_on in {} must be a dict of entry: [entries it depends on]".format(bundleyml))
+
+        return components, deps
 
     def check_hclt_files(self):
         for f in self.get_files():
@@ -521,26 +1602,15 @@ class Project():
             self.check_hclt_file(f)
 
     def get_files(self):
-        project_root = self.get_project_root(self.dir)
-        for (folder, fn) in flatwalk_up(project_root, self.dir):
+        for (folder, fn) in self.get_chain():
             if fn.endswith(self.inpattern):
                 yield "{}/{}".format(folder, fn)
 
     def get_yml_vars(self):
         if self.vars == None:
-            var_sources = {}
             project_root = self.get_project_root(self.dir)
-            self.vars={}
-            for (folder, fn) in flatwalk_up(project_root, self.dir):
-                if fn.endswith('.yml'):
-
-                    with open(r'{}/{}'.format(folder, fn)) as fh:
-                        d = yaml.load(fh, Loader=yaml.FullLoader)
-                        if type(d) == dict:
-                            for k,v in d.items():
-                                if type(v) in (str, int, float):
-                                    self.vars[k] = v
-                                    var_sources[k] =  '{}/{}'.format(folder, fn)
+            vars, var_sources = self.get_var_layer(self.dir, project_root)
+            self.vars = dict(vars)
 
             # special vars
             self.vars["PROJECT_ROOT"] = project_root
@@ -553,15 +1623,15 @@ class Project():
 
 
             # parse item values
-            for i in range(10):
-                for k,v in self.vars.items():
-                    if "${" in  v:
-                        self.vars[k] = self.parsetext(v)
-
             problems = []
+            in_cycle = set()
+
+            for cycle in Interpolator(self.vars).resolve():
+                in_cycle.update(cycle)
+                problems.append("File {}, circular reference in value of \"{}\": {}".format(os.path.relpath(var_sources[cycle[0]]), cycle[0], " -> ".join(cycle)))
 
             for k,v in self.vars.items():
-                if "${" in  v:
+                if type(v) is str and "${" in  v and k not in in_cycle:
                     msg = self.check_parsed_text(v)
                     if msg != "":
                         problems.append("File {}, cannot parse value of \"{}\"".format(os.path.relpath(var_sources[k]), k))
@@ -577,18 +1647,81 @@ class Project():
                 sys.stderr.write("\n")
                 raise ErrorParsingYmlVars(" ".join(problems))
 
-            # now for every value that starts with rspath(...), parse
-            for k,v in self.vars.items():
-                if v.startswith("rspath(") and v.endswith(")"):
-                    txt = self.parsetext(v[7:-1])
-                    (component, key) = txt.split(":")
-                    if self.remotestates == None:
-                        self.remotestates = RemoteStates()
-                    self.vars[k] = self.remotestates.value(component, key)
+    def get_rspaths(self, names=None):
+        '''
+        (var, component, key) for every var whose value is rspath(component:key),
+        only the vars in names when given
+        '''
+        out = []
+        for k,v in self.vars.items():
+            if names != None and k not in names:
+                continue
+            if type(v) is str and v.startswith("rspath(") and v.endswith(")"):
+                txt = self.parsetext(v[7:-1])
+                (component, key) = txt.split(":")
+                out.append((k, component, key))
+
+        return out
+
+    def resolve_rspaths(self, names=None):
+        # replaces rspath(...) values with the remote state outputs they refer to
+        rspaths = self.get_rspaths(names)
+        if len(rspaths) > 0:
+            if self.remotestates == None:
+                self.remotestates = RemoteStates()
+            self.remotestates.fetch([component for (k, component, key) in rspaths])
+
+            for (k, component, key) in rspaths:
+                self.vars[k] = self.remotestates.value(component, key)
+
+    def template_names(self):
+        # names of the vars referred to by the templates
+        names = set()
+        for fn,d in self.templates.items():
+            names.update(VAR_REGEX.findall(d['data']))
+        return names
+
+    def prefetch_rspaths(self, components):
+        '''
+        fetches, all at once, the remote states referred to by the templates of components.
+        Components which cannot be parsed are left for parse_template() to report
+        '''
+        wanted = []
+        for component in components:
+            self.set_dir(component)
+            try:
+                vars, sources = self.get_var_layer(self.dir, self.get_project_root(self.dir))
+                if not any(type(v) is str and v.startswith("rspath(") for v in vars.values()):
+                    continue
+
+                self.get_yml_vars()
+                self.get_template()
+                wanted += [c for (k, c, key) in self.get_rspaths(self.template_names())]
+            except Exception as e:
+                debug("prefetch_rspaths() skipping {}: {}".format(component, e))
+
+        if len(wanted) > 0:
+            if self.remotestates == None:
+                self.remotestates = RemoteStates()
+            try:
+                self.remotestates.fetch(wanted)
+            except Exception as e:
+                debug("prefetch_rspaths() {}".format(e))
 
     def save_outfile(self):
+        # terragrunt.hcl is only rewritten when its content changes, its mtime is otherwise preserved
+        content = self.hclfile
+        try:
+            with open(self.outfile, 'r') as fh:
+                if fh.read() == content:
+                    return False
+        except (OSError, IOError):
+            pass
+
         with open(self.outfile, 'w') as fh:
-            fh.write(self.hclfile)
+            fh.write(content)
+
+        return True
 
     @property
     def outfile(self):
@@ -638,16 +1771,16 @@ class Project():
     #     return "\n".join(out)
 
     def parsetext(self, s):
+        return Interpolator(self.vars).render(s)
 
-        # self.vars
-        for (k, v) in  self.vars.items():
-            s = s.replace('${' + k + '}', v)
-
-        # ENV VARS
-        for (k, v) in  os.environ.items():
-            s = s.replace('${' + k + '}', v)
-
-        return s
+    def get_suggestions(self):
+        '''
+        "did you mean" index of the vars and env vars, built on the first miss and shared by every
+        yml var and template of the component, the names of its vars are final by then
+        '''
+        if self.suggestions == None:
+            self.suggestions = Suggestions(list(self.vars.keys()) + list(os.environ.keys()))
+        return self.suggestions
 
     def check_parsed_text(self, s):
         regex = r"\$\{(.+?)\}"
@@ -659,54 +1792,83 @@ class Project():
         lines = s.split("\n")
         for line in lines:
             linenum += 1
-            try:
-                if line.strip()[0] != '#':
+            if "${" not in line or line.strip()[0] == '#':
+                continue
 
-                    matches = re.finditer(regex, line)
+            for match in re.finditer(regex, line):
+                miss = match.group()
 
-                    for matchNum, match in enumerate(matches):
-                        miss = match.group()
+                if len(lines) > 1:
+                    msg += "line {}:".format(linenum)
+                msg += "\n   No substitution found for {}".format(miss)
 
-                        if len(lines) > 1:
-                            msg += "line {}:".format(linenum)
-                        msg += "\n   No substitution found for {}".format(miss)
+                for k in self.get_suggestions().get(miss):
+                    msg += "\n   ==>  Perhaps you meant ${"+k+"}?"
 
-                        lim = 80
-                        near_matches = {}
-                        for k in self.vars.keys():
-                            ratio = fuzz.ratio(miss, k)
-                            if ratio >= lim:
-                                near_matches[k] = ratio
+                msg += "\n"
 
-                        for k in os.environ.keys():
-                            ratio = fuzz.ratio(miss, k)
-                            if ratio >= lim:
-                                near_matches[k] = ratio
+        #debug(msg)
+        return msg
 
-                        for k,ratio in near_matches.items():
-                            msg += "\n   ==>  Perhaps you meant ${"+k+"}?"
 
-                        msg += "\n"
+    def render_key(self):
+        '''
+        hash of everything that contributes to the rendered terragrunt.hcl: the hclt and yml
+        files of the component and its parents, and the env vars they refer to.
+        Returns None when the component cannot be cached (remote state values)
+        '''
+        project_root = self.get_project_root(self.dir)
+        parts = ["render-v1", os.path.abspath(project_root), self.component_path, os.path.abspath(__file__)]
+        names = set()
 
-            except IndexError: # an empty line has no first character ;)
-                pass
+        for (folder, fn) in self.get_chain():
+            if fn.endswith(self.inpattern) or fn.endswith('.yml'):
+                with open('{}/{}'.format(folder, fn), 'rb') as fh:
+                    data = fh.read()
 
-        #debug(msg)
-        return msg
+                if fn.endswith('.yml') and b"rspath(" in data:
+                    return None
+
+                parts += [folder, fn, hashlib.sha256(data).hexdigest()]
+                names.update(re.findall(rb"\$\{(.+?)\}", data))
 
+        for name in sorted(names):
+            name = name.decode('utf-8', errors='replace')
+            # an unset var is not substituted, unlike an empty one
+            parts += [name, name in os.environ, os.environ.get(name, "")]
+
+        return Cache.key(*parts)
 
     def parse_template(self):
 
+        key = self.render_key()
+        cache = Cache("render")
+        if key != None:
+            cached = cache.get(key)
+            if cached != None:
+                debug("parse_template() {} served from cache".format(self.dir))
+                self.vars = cached["vars"]
+                self.out_string = cached["out"]
+                self.template_lines = [tuple(l) for l in cached.get("lines", [])]
+                self.parse_messages = []
+                return
+
         self.check_hclt_files()
         self.get_yml_vars()
         self.get_template()
+        self.resolve_rspaths(self.template_names())
 
         self.out_string=u""
 
         self.parse_messages = []
+        self.template_lines = []
+        line = 1
 
         for fn,d in self.templates.items():
             parsed = self.parsetext(d['data'])
+            self.template_lines.append((d['filename'], line))
+            line += parsed.count("\n") + 1
+
             msg = self.check_parsed_text(parsed)
             if msg != "":
                 self.parse_messages.append("File: {}".format(os.path.relpath(d['filename'])))
@@ -715,6 +1877,9 @@ class Project():
             self.out_string += parsed
             self.out_string += "\n"
 
+        if key != None and len(self.parse_messages) == 0:
+            cache.set(key, {"vars": self.vars, "out": self.out_string, "lines": self.template_lines})
+
     @property
     def parse_status(self):
         if len(self.parse_messages) == 0:
@@ -725,40 +1890,391 @@ class Project():
 
     @property
     def hclfile(self):
-        self.parse_template()
+        if self.out_string == None:
+            self.parse_template()
         return self.out_string
 
+# Project used by render_component() in worker processes
+render_project = None
+
+def init_render_worker(project):
+    global render_project
+    render_project = project
+
+def render_component(component):
+    '''
+    parses a component and saves its terragrunt.hcl, returns None on success or a message
+    explaining why the component could not be parsed
+    '''
+    project = render_project
+    project.set_dir(component)
+    try:
+        project.parse_template()
+        project.save_outfile()
+    except Exception as e:
+        return "ERROR while parsing {}: {}".format(component, e)
+
+    if project.parse_status != True:
+        return project.parse_status
+
+    return None
+
+def render_components(project, components, jobs=1):
+    '''
+    renders components, across a pool of worker processes when jobs > 1.
+    Returns the messages of the components that could not be parsed, in components order
+    '''
+    jobs = min(jobs, len(components))
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_render_worker, initargs=(project,)) as pool:
+            results = list(pool.map(render_component, components))
+    else:
+        init_render_worker(project)
+        results = [render_component(c) for c in components]
+
+    return [r for r in results if r != None]
+
+class Inotify():
+    '''
+    directory watches through the inotify api of linux, called through ctypes on libc.
+    Raises OSError when inotify is not available, or when the limit of watches is reached
+    '''
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+
+    mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on linux")
+
+        import ctypes, ctypes.util
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            self.error()
+        # watch descriptor -> directory
+        self.dirs = {}
+
+    def error(self):
+        errno = self.ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+    def add(self, path):
+        # a directory already watched keeps its descriptor, under its new path when it was moved
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask)
+        if wd < 0:
+            self.error()
+        self.dirs[wd] = path
+
+    def read(self, timeout=None):
+        '''
+        (directory, name, mask) of the events received within timeout seconds, [] when there are none.
+        directory is None when events were lost
+        '''
+        readable, w, x = select.select([self.fd], [], [], timeout)
+        if len(readable) == 0:
+            return []
+
+        data = os.read(self.fd, 64*1024)
+        events = []
+        i = 0
+        while i + 16 <= len(data):
+            (wd, mask, cookie, length) = struct.unpack_from("iIII", data, i)
+            name = os.fsdecode(data[i+16:i+16+length].rstrip(b"\0"))
+            i += 16 + length
+
+            if mask & self.IN_Q_OVERFLOW:
+                events.append((None, None, mask))
+            elif mask & self.IN_IGNORED:
+                # the directory is gone
+                self.dirs.pop(wd, None)
+            elif wd in self.dirs:
+                events.append((self.dirs[wd], name, mask))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class Watcher():
+    '''
+    keeps a Project in memory and re-renders the components whose chain includes a hclt or
+    yml file that changed. On linux the directories of the project are watched with inotify,
+    otherwise the tree is polled every interval seconds
+    '''
+
+    def __init__(self, project, wdir='.', interval=1.0):
+        self.project = project
+        self.wdir = os.path.relpath(wdir)
+        self.root = os.path.abspath(project.get_project_root(wdir))
+        self.interval = interval
+        self.files = {}
+        self.inotify = None
+
+    def watched(self, fn):
+        return fn.endswith(self.project.inpattern) or fn.endswith('.yml')
+
+    def scan(self, files, folder, recursive=True):
+        '''
+        lists the hclt and yml files of folder, and of the directories below it when recursive, in files
+        as path -> (mtime, size), their former entries are dropped first. The directories are watched when
+        inotify is used
+        '''
+        prefix = folder + os.sep
+        for f in [f for f in files if os.path.dirname(f) == folder or (recursive and f.startswith(prefix))]:
+            del files[f]
+
+        ignore = self.project.get_ignore(self.root)
+        rel = os.path.relpath(folder, self.root)
+        if rel != '.' and is_ignored(os.path.normpath(rel), ignore):
+            return files
+
+        for (d, dirs, fns) in walk(folder, ignore, base=self.root):
+            if self.inotify != None:
+                self.inotify.add(d)
+
+            for fn in fns:
+                if self.watched(fn):
+                    path = os.path.join(d, fn)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (st.st_mtime_ns, st.st_size)
+
+            if not recursive:
+                break
+
+        return files
+
+    def snapshot(self):
+        # path -> (mtime, size) of the hclt and yml files of the project
+        return self.scan({}, self.root)
+
+    def components(self):
+        out = []
+        for which, c, match in self.project.get_components():
+            if which == "component" and (self.wdir == '.' or c == self.wdir or c.startswith(self.wdir + os.sep)):
+                out.append(c)
+        return out
+
+    def affected(self, changed):
+        # components at or below the directory of a changed file
+        folders = set(os.path.dirname(f) for f in changed)
+        out = []
+        for c in self.components():
+            d = os.path.abspath(c)
+            for f in folders:
+                if d == f or d.startswith(f + os.sep):
+                    out.append(c)
+                    break
+        return out
+
+    def invalidate(self, changed, tree_changed):
+        # bundle.yml may have changed
+        self.project.bundles = {}
+
+        if tree_changed:
+            # files were added or removed, the tree is indexed again
+            self.project.indexes = []
+            self.project.components = None
+            self.project.ignore = {}
+            self.project.layers = {}
+            return
+
+        folders = set(os.path.dirname(f) for f in changed)
+        for key in list(self.project.layers.keys()):
+            d = key[0]
+            for f in folders:
+                if d == f or d.startswith(f + os.sep):
+                    del self.project.layers[key]
+                    break
+
+    def render(self, components):
+        init_render_worker(self.project)
+        for c in components:
+            msg = render_component(c)
+            if msg == None:
+                log("rendered {}".format(c))
+            else:
+                log(msg)
+
+    def update(self, files):
+        '''
+        re-renders the components affected by the differences between files and the former
+        listing of the project, returns them
+        '''
+        changed = [f for f in set(files) | set(self.files) if files.get(f) != self.files.get(f)]
+        tree_changed = set(files) != set(self.files)
+        self.files = files
+
+        if len(changed) == 0:
+            return []
+
+        for f in changed:
+            debug("changed {}".format(f))
+
+        self.invalidate(changed, tree_changed)
+        components = self.affected(changed)
+        self.render(components)
+        return components
+
+    def poll(self):
+        '''
+        re-renders the components affected by the changes since the last poll, returns them
+        '''
+        return self.update(self.snapshot())
+
+    def watch(self, timeout=None):
+        '''
+        waits up to timeout seconds for inotify events, re-renders the components affected by them
+        and returns them. Only the directories named by the events are listed again
+        '''
+        events = self.inotify.read(timeout)
+        if len(events) == 0:
+            return []
+
+        # a save often comes as several events, the ones that closely follow are handled together
+        more = self.inotify.read(0.05)
+        while len(more) > 0:
+            events += more
+            more = self.inotify.read(0.05)
+
+        files = dict(self.files)
+        folders = set()
+        for (folder, name, mask) in events:
+            if folder == None:
+                # events were lost, the whole tree is listed again
+                return self.update(self.scan(files, self.root))
+            elif mask & Inotify.IN_ISDIR:
+                self.scan(files, os.path.join(folder, name))
+            elif self.watched(name):
+                folders.add(folder)
+
+        for folder in folders:
+            self.scan(files, folder, recursive=False)
+
+        return self.update(files)
+
+    def stop_inotify(self):
+        if self.inotify != None:
+            self.inotify.close()
+            self.inotify = None
+
+    def run(self):
+        try:
+            self.inotify = Inotify()
+            self.files = self.snapshot()
+        except OSError as e:
+            debug("cannot use inotify, polling instead: {}".format(e))
+            self.stop_inotify()
+            self.files = self.snapshot()
+
+        self.render(self.components())
+        log("")
+        log("watching {} for changes, ctrl-c to stop".format(self.wdir))
+
+        try:
+            while True:
+                if self.inotify != None:
+                    try:
+                        self.watch(self.interval)
+                        continue
+                    except OSError as e:
+                        # e.g. the limit of watches was reached, the next poll catches up
+                        debug("inotify failed, polling instead: {}".format(e))
+                        self.stop_inotify()
+
+                time.sleep(self.interval)
+                self.poll()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop_inotify()
+
+        return 0
+
 class Utils():
 
-    conf_dir = os.path.expanduser("~/.config/terrabuddy")
-    bin_dir = os.path.expanduser("~/.config/terrabuddy/bin")
+    conf_dir = os.getenv("TB_CONF_DIR", os.path.expanduser("~/.config/terrabuddy"))
+    bin_dir = os.path.join(conf_dir, "bin")
+
+    terragrunt_latest_url = "https://github.com/gruntwork-io/terragrunt/releases/latest"
+    terragrunt_download_url = "https://github.com/gruntwork-io/terragrunt/releases/download"
+    terraform_index_url = "https://releases.hashicorp.com/terraform/index.json"
+    terraform_releases_url = "https://releases.hashicorp.com/terraform"
+    platform = "linux_amd64"
+    # seconds, for the latest versions lookups
+    http_timeout = 10
+    install_lock = threading.Lock()
+    versions_ttl = 8*60*60
 
     @staticmethod
-    def download_progress(url, filename, w=None):
+    def download_progress(url, filename, w=None, sha256=None, timeout=10):
+        '''
+        downloads url to filename. The download goes to filename.part first, a .part left
+        by an interrupted download is resumed. The file is verified against sha256 when given
+        '''
         if w == None:
-            rows, columns = os.popen('stty size', 'r').read().split()
-            w = int(columns) - 5
-
-        with open(filename, "wb") as f:
-           response = requests.get(url, stream=True)
-           total_length = response.headers.get('content-length')
-
-           if total_length is None: # no content length header
-               f.write(response.content)
-           else:
-               dl = 0
-               total_length = int(total_length)
-               for data in response.iter_content(chunk_size=4096):
-                   dl += len(data)
-                   f.write(data)
-                   done = int(w * dl / total_length)
-                   sys.stdout.write("\r[%s%s]" % ('=' * done, ' ' * (w-done)) )    
-                   sys.stdout.flush()
-
-        print("")
+            w = shutil.get_terminal_size().columns - 5
+
+        part = "{}.part".format(filename)
+        headers = {}
+        dl = 0
+        if os.path.isfile(part):
+            dl = os.path.getsize(part)
+            headers["Range"] = "bytes={}-".format(dl)
+
+        with requests.get(url, stream=True, headers=headers, timeout=timeout) as response:
+            if response.status_code == 416:
+                # the .part is already complete
+                debug("{} already downloaded".format(url))
+            else:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    # the server does not support ranges, start over
+                    dl = 0
+
+                total_length = response.headers.get('content-length')
+                if total_length != None:
+                    total_length = dl + int(total_length)
+
+                # about a hundred chunks per download, no smaller than 64k and no larger than 1M
+                chunk_size = 64*1024
+                if total_length != None:
+                    chunk_size = min(max(total_length // 100, 64*1024), 1024*1024)
+
+                with open(part, "ab" if dl > 0 else "wb") as f:
+                    for data in response.iter_content(chunk_size=chunk_size):
+                        dl += len(data)
+                        f.write(data)
+                        if LOG == True and total_length != None:
+                            done = int(w * dl / total_length)
+                            sys.stdout.write("\r[%s%s]" % ('=' * done, ' ' * (w-done)) )
+                            sys.stdout.flush()
 
-        
-    def __init__(self, terraform_path=None, terragrunt_path=None):
+                log("")
+
+        if sha256 != None:
+            digest = file_sha256(part)
+            if digest != sha256:
+                os.unlink(part)
+                raise DownloadException("ERROR: checksum mismatch for {}, expected {} but got {}".format(url, sha256, digest))
+
+        os.replace(part, filename)
+
+    def __init__(self, terraform_path=None, terragrunt_path=None, project_root=None):
         self.terragrunt_v =  None
         self.terraform_v = None
 
@@ -773,8 +2289,16 @@ class Utils():
             self.bin_dir = os.path.expanduser(self.conf['bin_dir'])
         except:
             pass
+
+        # versions pinned by the project are kept side by side under bin_dir/versions
+        self.pins = {}
+        if project_root != None:
+            self.pins = pinned_versions(project_root)
+
         if terraform_path == None:
             terraform_path = "{}/terraform".format(self.bin_dir)
+            if "terraform" in self.pins:
+                terraform_path = self.versioned_path("terraform", self.pins["terraform"])
             if not os.path.isdir(self.bin_dir):
                 os.makedirs(self.bin_dir)
 
@@ -782,6 +2306,8 @@ class Utils():
 
         if terragrunt_path == None:
             terragrunt_path = "{}/terragrunt".format(self.bin_dir)
+            if "terragrunt" in self.pins:
+                terragrunt_path = self.versioned_path("terragrunt", self.pins["terragrunt"])
             if not os.path.isdir(self.bin_dir):
                 os.makedirs(self.bin_dir)
 
@@ -790,46 +2316,104 @@ class Utils():
         if not os.path.isdir(self.conf_dir):
             os.makedirs(self.conf_dir)
 
+    @staticmethod
+    def for_dir(dir="."):
+        '''
+        Utils using the binaries set by TERRAFORM_BIN and TERRAGRUNT_BIN, or else those pinned by
+        the project dir belongs to
+        '''
+        try:
+            project_root = Project().get_project_root(dir)
+        except Exception:
+            project_root = None
+
+        return Utils(
+            terragrunt_path = os.getenv("TERRAGRUNT_BIN"),
+            terraform_path = os.getenv("TERRAFORM_BIN"),
+            project_root = project_root
+        )
+
+    def versioned_path(self, name, version):
+        return "{}/versions/{}/{}/{}".format(self.bin_dir, name, version, name)
+
+    def install_pinned(self):
+        '''
+        installs the pinned versions which are not installed yet, right before terragrunt runs.
+        Raises DownloadException when they cannot be downloaded
+        '''
+        # remote states are read concurrently, a binary is only installed once
+        with Utils.install_lock:
+            try:
+                if "terraform" in self.pins and self.terraform_path == self.versioned_path("terraform", self.pins["terraform"]):
+                    if not os.path.isfile(self.terraform_path):
+                        self.install_terraform(self.pins["terraform"])
+
+                if "terragrunt" in self.pins and self.terragrunt_path == self.versioned_path("terragrunt", self.pins["terragrunt"]):
+                    if not os.path.isfile(self.terragrunt_path):
+                        self.install_terragrunt(self.pins["terragrunt"])
+            except requests.exceptions.RequestException as e:
+                raise DownloadException("ERROR: could not download the versions pinned in project.yml: {}".format(e))
+
 
     def terragrunt_currentversion(self):
         if self.terragrunt_v == None:
-            response = requests.get('https://github.com/gruntwork-io/terragrunt/releases/latest')
-            
+            cache = Cache("versions")
+            cached = cache.get("terragrunt-latest", ttl=self.versions_ttl)
+            if cached != None:
+                self.terragrunt_v = tuple(cached)
+                return self.terragrunt_v
+
+            response = requests.get(self.terragrunt_latest_url, timeout=self.http_timeout)
+
             for resp in response.history:
                 loc = resp.headers['Location']
 
             latest = loc.split("/").pop(-1)
             self.terragrunt_v = (latest, loc)
+            cache.set("terragrunt-latest", self.terragrunt_v)
 
         return self.terragrunt_v
 
 
     def terraform_currentversion(self):
         if self.terraform_v == None:
-            r = requests.get("https://releases.hashicorp.com/terraform/index.json")  
-            obj = json.loads(r.content)
-            versions = []
-            for k in obj['versions'].keys():
-                a,b,c = k.split('.')
-
-                try:
-                    v1 = "{:05}".format(int(a))
-                    v2 = "{:05}".format(int(b))
-                    v3 = "{:05}".format(int(c))
-                    versions.append("{}.{}.{}".format(v1, v2, v3))
-                except ValueError:
-                    # if alphanumeric chars in version
-                    # this excludes, rc, alpha, beta versions
-                    continue
+            cache = Cache("versions")
+            cached = cache.get("terraform-latest", ttl=self.versions_ttl)
+            if cached != None:
+                self.terraform_v = tuple(cached)
+                return self.terraform_v
+
+            # the index is large, it is only downloaded again when it changed
+            index = cache.get("terraform-index") or {}
+            headers = {}
+            # a 304 is only useful with a version to fall back on
+            if index.get("latest"):
+                if index.get("etag"):
+                    headers["If-None-Match"] = index["etag"]
+                if index.get("last_modified"):
+                    headers["If-Modified-Since"] = index["last_modified"]
+
+            with requests.get(self.terraform_index_url, headers=headers, stream=True, timeout=self.http_timeout) as r:
+                if r.status_code == 304 and index.get("latest"):
+                    debug("terraform index not modified")
+                else:
+                    r.raise_for_status()
+                    index = {
+                        "latest": latest_version(scan_versions(r.iter_content(chunk_size=64*1024))),
+                        "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified")
+                    }
 
-            versions.sort() # newest will be at the end
-            v1, v2, v3 = versions.pop(-1).split(".")
+            if index["latest"] == None:
+                raise DownloadException("ERROR: no terraform release found in {}".format(self.terraform_index_url))
 
-            latest = "{}.{}.{}".format(int(v1), int(v2), int(v3))
+            cache.set("terraform-index", index)
+            latest = index["latest"]
 
-            url = "https://releases.hashicorp.com/terraform/{}/terraform_{}_linux_amd64.zip".format(latest, latest)
+            url = "{}/{}/terraform_{}_{}.zip".format(self.terraform_releases_url, latest, latest, self.platform)
 
             self.terraform_v = (latest, url)
+            cache.set("terraform-latest", self.terraform_v)
 
         return self.terraform_v
 
@@ -845,7 +2429,7 @@ class Utils():
         else:
             if "terraform" in missing:
                 log("Installing terraform")
-                self.install_terraform()
+                self.install_terraform(self.pins.get("terraform"))
             elif "terraform" in outofdate and update:
                 log("Updating terraform")
                 self.install_terraform()
@@ -853,46 +2437,119 @@ class Utils():
             if "terragrunt" in missing:
                 debug('"terragrunt" in missing')
                 log("Installing terragrunt")
-                self.install_terragrunt()
+                self.install_terragrunt(self.pins.get("terragrunt"))
             elif "terragrunt" in outofdate and update:
                 log("Updating terragrunt")
                 self.install_terragrunt()
 
 
+    def download_cached(self, name, version, filename, url, sha256=None):
+        '''
+        path of filename in the download cache, which is keyed on name, version and platform.
+        It is only downloaded when missing, or when it does not match sha256
+        '''
+        # kept out of cache/, tb --clean does not throw the downloads away
+        d = "{}/downloads/{}/{}/{}".format(self.conf_dir, name, version, self.platform)
+        path = "{}/{}".format(d, filename)
+
+        if os.path.isfile(path) and (sha256 == None or file_sha256(path) == sha256):
+            debug("{} found in the download cache".format(path))
+            return path
+
+        if not os.path.isdir(d):
+            os.makedirs(d, exist_ok=True)
+
+        Utils.download_progress(url, path, sha256=sha256, timeout=self.http_timeout)
+        return path
+
+    def checksum(self, name, version, url, filename, required=True):
+        '''
+        sha256 of filename, as listed in the SHA256SUMS file at url. When it cannot be found
+        DownloadException is raised, or None is returned if the checksum is not required
+        '''
+        try:
+            path = self.download_cached(name, version, os.path.basename(url), url)
+            with open(path, 'r') as fh:
+                for line in fh:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1].lstrip("*") == filename:
+                        return parts[0].lower()
+            error = "{} is not listed in {}".format(filename, url)
+        except Exception as e:
+            error = "cannot read {}: {}".format(url, e)
+
+        if required:
+            raise DownloadException("ERROR: no checksum for {} {}, {}".format(name, version, error))
+
+        debug("no checksum for {} {}, {}".format(name, version, error))
+        return None
+
+    def install_binary(self, src, path):
+        # src is written next to path then moved in place, a running binary is never overwritten
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(tmp, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024*1024)
+
+        os.chmod(tmp, 0o755) # make executable
+        os.replace(tmp, path)
+
     def install_terraform(self, version=None):
-        currentver, url = self.terraform_currentversion()
         if version == None:
-            version = currentver
+            version, url = self.terraform_currentversion()
 
-        log("Downloading terraform {} to {}...".format(version, self.terraform_path))
-        Utils.download_progress(url, self.terraform_path+".zip")
+        base = "{}/{}".format(self.terraform_releases_url, version)
+        filename = "terraform_{}_{}.zip".format(version, self.platform)
 
-        with zipfile.ZipFile(self.terraform_path+".zip", 'r') as zip_ref:
-            zip_ref.extract("terraform", os.path.abspath('{}/../'.format(self.terraform_path) ))
-            
-        os.chmod(self.terraform_path, 500) # make executable
-        os.unlink(self.terraform_path+".zip") # delete zip
+        sha256 = self.checksum("terraform", version, "{}/terraform_{}_SHA256SUMS".format(base, version), filename)
+
+        log("Installing terraform {} to {}...".format(version, self.terraform_path))
+        zip_path = self.download_cached("terraform", version, filename, "{}/{}".format(base, filename), sha256)
+
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            with zip_ref.open("terraform") as src:
+                self.install_binary(src, self.terraform_path)
 
     def install_terragrunt(self, version=None):
         # https://github.com/gruntwork-io/terragrunt/releases/download/v0.23.16/terragrunt_linux_amd64
-        currentver, loc = self.terragrunt_currentversion()
         if version == None:
-            version = currentver
-        url = "https://github.com/gruntwork-io/terragrunt/releases/download/{}/terragrunt_linux_amd64".format(version)
+            version, loc = self.terragrunt_currentversion()
 
-        log("Downloading terragrunt {} to {}...".format(version, self.terragrunt_path))
-        Utils.download_progress(url, self.terragrunt_path)
+        base = "{}/{}".format(self.terragrunt_download_url, version)
+        filename = "terragrunt_{}".format(self.platform)
 
-        os.chmod(self.terragrunt_path, 500) # make executable
+        # older releases do not publish checksums
+        sha256 = self.checksum("terragrunt", version, "{}/SHA256SUMS".format(base), filename, required=False)
+
+        log("Installing terragrunt {} to {}...".format(version, self.terragrunt_path))
+        path = self.download_cached("terragrunt", version, filename, "{}/{}".format(base, filename), sha256)
+
+        with open(path, 'rb') as src:
+            self.install_binary(src, self.terragrunt_path)
 
         log("DONE")
 
 
+    def probe(self, path, updates=True):
+        '''
+        (out, err, retcode) of <path> --version. Without updates only the exit code matters,
+        127 when the binary is missing, and the binary is looked up without being run
+        '''
+        if not updates:
+            if shutil.which(path) == None:
+                return ("", "", 127)
+            return ("", "", 0)
+
+        return run("{} --version".format(path))
+
     def check_setup(self, verbose=True, updates=True):
         missing = []
         outofdate = []
         debug(self.terraform_path)
-        out, err, retcode = run("{} --version".format(self.terraform_path))
+        # pinned versions are never reported out of date
+        out, err, retcode = self.probe(self.terraform_path, updates and "terraform" not in self.pins)
 
         debug("check setup")
         debug((out, err, retcode))
@@ -901,13 +2558,13 @@ class Utils():
             missing.append("terraform")
             if verbose:
                 log("terraform not installed, you can download it from https://www.terraform.io/downloads.html")
-        elif "Your version of Terraform is out of date" in out and updates:
+        elif "Your version of Terraform is out of date" in out and updates and "terraform" not in self.pins:
             outofdate.append("terraform")
             if verbose:
                 log("Your version of terraform is out of date! You can update by running 'tb --setup', or by manually downloading from https://www.terraform.io/downloads.html")
 
 
-        out, err, retcode = run("{} --version".format(self.terragrunt_path))
+        out, err, retcode = self.probe(self.terragrunt_path, updates and "terragrunt" not in self.pins)
 
         debug((out, err, retcode))
         if retcode == 127:
@@ -915,7 +2572,7 @@ class Utils():
             if verbose:
                 log("terragrunt not installed, you can download it from https://github.com/gruntwork-io/terragrunt/releases")
 
-        elif retcode == 0 and updates:
+        elif retcode == 0 and updates and "terragrunt" not in self.pins:
             installedver = ""
             for line in out.split("\n"):
                 if "terragrunt version" in line:
@@ -932,44 +2589,68 @@ class Utils():
 
         return (missing, outofdate)
 
-    def autocheck(self, hours=8):
-        check_file = "{}/autocheck_timestamp".format(self.conf_dir)
-        if not os.path.isfile(check_file):
-            diff = hours*60*60 # 8 hours
-        else:
-            last_check = int(os.stat(check_file).st_mtime)
-            diff = int(time.time() - last_check)
-
-        updates = False
-        if diff >= hours*60*60:
-            updates = True
-            if os.path.isfile(check_file):
-                '''
-                The previous check file has expired, we want to delete it so that it will be recreated in the block below
-                '''
-                os.unlink(check_file)
+    def binary_stamp(self, path):
+        # (path, mtime, size) of a binary, changes when it is updated
+        found = shutil.which(path)
+        if found == None:
+            return (path, None, None)
+        st = os.stat(found)
+        return (found, st.st_mtime_ns, st.st_size)
 
-        else:
-            debug("last check {} hours ago".format(float(diff)/3600))
+    def updates_key(self):
+        return Cache.key("outdated", self.binary_stamp(self.terraform_path), self.binary_stamp(self.terragrunt_path))
+
+    def check_updates(self):
+        '''
+        records which binaries are out of date, for autocheck() to report
+        '''
+        key = self.updates_key()
+        try:
+            missing, outdated = self.check_setup(verbose=False, updates=True)
+        except Exception as e:
+            debug("check_updates() failed: {}".format(e))
+            return -1
 
-        missing, outdated = self.check_setup(verbose=True, updates=updates)
+        Cache("versions").set(key, outdated)
+        return 0
+
+    def autocheck(self, hours=8):
+        '''
+        reports missing binaries, and the updates found by the last check. Updates are checked
+        at most once every hours, in a background process, never delaying the command
+        '''
+        missing, outdated = self.check_setup(verbose=True, updates=False)
         if len(missing) > 0:
             return -1
 
-        if len(outdated) == 0 and not os.path.isfile(check_file):
-            '''
-            since checking for updates takes a few seconds, we only want to do this once every 8 hours
-            HOWEVER, once the update is available, we want to inform the user on EVERY EXEC, since they might
-            not see the prompt immediately. 
-            '''
-            with open(check_file, "w") as fh:
-                pass # check again in 8 hours
-            
+        cache = Cache("versions")
+        key = self.updates_key()
+
+        # once an update is available, it is reported on every run until the binary is updated
+        for which in cache.get(key) or []:
+            log("Your version of {} is out of date! You can update by running 'tb --setup'".format(which))
+
+        if cache.get(key, ttl=hours*60*60) == None:
+            pending = Cache.key("pending", key)
+            if cache.get(pending, ttl=10*60) == None:
+                cache.set(pending, True)
+                self.start_check_updates()
 
+    def start_check_updates(self):
+        # detached, so that the check outlives short commands
+        env = dict(os.environ)
+        env["TERRAFORM_BIN"] = self.terraform_path
+        env["TERRAGRUNT_BIN"] = self.terragrunt_path
+        # the results go where this process keeps its cache
+        env["TB_CONF_DIR"] = self.conf_dir
+        Popen([sys.executable, os.path.abspath(__file__), "--check-updates"], stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL, env=env, start_new_session=True)
 
     def setup(self, args):
         debug("setup terragrunt")
 
+        if args.check_updates:
+            return self.check_updates()
+
         if args.setup:
             self.install()
 
@@ -985,7 +2666,7 @@ class Utils():
                 log("terraform and terragrunt installed and up to date")
 
         else:
-            # auto check once every 8 hours
+            # updates are checked once every 8 hours
             self.autocheck()
 
         if args.setup_terraformrc:
@@ -1031,12 +2712,21 @@ def main(argv=[]):
     export TB_NO_GIT_CHECK=y            # activates --no-git-check
     export TB_MODULES_PATH              # required if using --dev
     export TB_GIT_FILTER                # when displaying components, only show those which have uncomitted git files
+    export TB_PARALLELISM=N             # activates --parallelism N
+    export TB_PARSE_JOBS=N              # number of processes parsing bundle components, defaults to the number of cpus
+    export TB_SOURCE_UPDATE=y           # activates --source-update
+    export TB_WATCH_INTERVAL=N          # seconds between two checks for changes of tb watch, defaults to 1
+    export TB_REMOTE_STATE_TTL=N        # keep remote state outputs read by rspath() on disk for N seconds
+    export TB_CONF_DIR=path             # configuration and cache directory, defaults to ~/.config/terrabuddy
     """
     #TGARGS=("--force", "-f", "-y", "--yes", "--clean", "--dev", "--no-check-git")
 
-    f = Figlet(font='slant')
+    description = 'TB, facilitates calling terragrunt with nifty features n such.'
+    if anyof(["-h", "--help"], argv):
+        # the banner takes a while to render, it is only shown with the help
+        description = '{}\n{}'.format(pyfiglet.Figlet(font='slant').renderText('terrabuddy'), description)
 
-    parser = argparse.ArgumentParser(description='{}\nTB, facilitates calling terragrunt with nifty features n such.'.format(f.renderText('terrabuddy')),
+    parser = argparse.ArgumentParser(description=description,
     add_help=True,
     epilog=epilog,
     formatter_class=argparse.RawTextHelpFormatter)
@@ -1049,9 +2739,11 @@ def main(argv=[]):
     #parser.add_argument('--dev', default=None, help="if in dev mode, which dev module path to reference (TB_MODULES_PATH env var must be set and point to your local terragrunt repository path)")
     parser.add_argument('--downstream-args', default=None, help='optional arguments to pass downstream to terragrunt and terraform')
     parser.add_argument('--key', default=None, help='optional remote state key to return')
+    parser.add_argument('--parallelism', type=int, default=int(os.getenv('TB_PARALLELISM', 1)), help='number of bundle components to run concurrently, components only start once those they depend on have succeeded')
 
     # booleans
-    parser.add_argument('--clean', dest='clean', action='store_true', help='clear all cache')
+    parser.add_argument('--source-update', action='store_true', help='re-download module sources, by default they are only updated when the terraform source of a component changes')
+    parser.add_argument('--clean', dest='clean', action='store_true', help='clear the cache, e.g. rendered templates, downloaded binaries are kept')
     parser.add_argument('--force', '--yes', '-t', '-f', action='store_true', help='Perform terragrunt action without asking for confirmation (same as --terragrunt-non-interactive)')
     parser.add_argument('--dry', action='store_true', help="dry run, don't actually do anything")
     parser.add_argument('--allow-no-remote-state', action='store_true', help="allow components to be run without a remote state block")
@@ -1063,6 +2755,7 @@ def main(argv=[]):
     parser.add_argument('--list', action='store_true', help='list components in project')
     parser.add_argument('--setup', action='store_true', help='Install terraform and terragrunt')
     parser.add_argument('--check-setup', action='store_true', help='Check if terraform and terragrunt are up to date')
+    parser.add_argument('--check-updates', action='store_true', help=argparse.SUPPRESS)
     parser.add_argument('--setup-shell', action='store_true', help='Export a list of handy aliases to the shell.  Can be added to ~./bashrc')
     parser.add_argument('--setup-terraformrc', action='store_true', help='Setup sane terraformrc defaults')
     parser.add_argument('--debug', action='store_true', help='display debug messages')
@@ -1082,22 +2775,26 @@ def main(argv=[]):
         DEBUG = True
         log("debug mode enabled")
 
-    (exitcode, path, err) = run("which terraform")
-    terraform_path = None
-    if exitcode == 0:
-        terraform_path = path.strip()
-    (exitcode, path, err) = run("which terragrunt")
-    terragrunt_path = None
-    if exitcode == 0:
-        terragrunt_path = path.strip()
-
-    u = Utils(
-        terragrunt_path = os.getenv("TERRAGRUNT_BIN", terragrunt_path),
-        terraform_path = os.getenv("TERRAFORM_BIN", terraform_path)
-    )
+    u = Utils.for_dir('.')
     u.setup(args)
 
-    if args.setup_shell or args.setup_terraformrc or args.check_setup  or args.setup:
+    def install_pinned():
+        # pinned versions are only downloaded when terragrunt is about to run
+        try:
+            u.install_pinned()
+        except DownloadException as e:
+            sys.stderr.write("{}\n".format(e))
+            return False
+        return True
+
+    if args.clean:
+        Cache.clear()
+        log("Cache cleared")
+
+    if args.setup_shell or args.setup_terraformrc or args.check_setup  or args.setup or args.check_updates:
+        return 0
+
+    if args.clean and len(args.command) < 2:
         return 0
 
     # grab args
@@ -1111,6 +2808,9 @@ def main(argv=[]):
     if args.downstream_args != None:
         wt.set_option(args.downstream_args)
 
+    if args.source_update or os.getenv('TB_SOURCE_UPDATE', 'n')[0].lower() in ['y', 't', '1']:
+        wt.set_source_update()
+
     if len(args.command) < 2:
 
         if args.list:
@@ -1146,7 +2846,8 @@ def main(argv=[]):
     #TODO add "env" command to show the env vars with optional --export command for exporting to bash env vars
 
     if command == "format":
-        for (dirpath, filename) in flatwalk('.'):
+        root = project.get_project_root('.')
+        for (dirpath, filename) in flatwalk('.', project.get_ignore(root), base=root):
             if filename.endswith('.hclt'):
                 project.format_hclt_file("{}/{}".format(dirpath, filename))
     
@@ -1157,6 +2858,14 @@ def main(argv=[]):
     #         # no component provided, loop over all and parse them
 
 
+    if command == "watch":
+        try:
+            wdir = os.path.relpath(args.command[2])
+        except IndexError:
+            wdir = '.'
+
+        return Watcher(project, wdir, interval=float(os.getenv('TB_WATCH_INTERVAL', 1))).run()
+
     if command in ("plan", "apply", "destroy", "refresh", "show", "force-unlock", "parse", "showvars"):
 
         try:
@@ -1189,6 +2898,7 @@ def main(argv=[]):
             project.save_outfile()
 
             if command == "showvars":
+                project.resolve_rspaths()
                 if args.json:
                     print (json.dumps(project.vars, indent=4))
                 else:
@@ -1225,20 +2935,17 @@ def main(argv=[]):
                     wt.set_option('-no-color')
 
                 if not args.dry:               
-                    runshow(wt.get_command(command=command, wdir=wdir))
+                    if not install_pinned():
+                        return -1
+                    if runshow(wt.get_command(command=command, wdir=wdir)) == 0:
+                        wt.source_updated(wdir)
         elif t == "bundle":
             log("Performing {} on bundle {}".format(command, wdir))
             log("")
             # parse first
-            parse_status = []
-            components = project.get_bundle(wdir)
-            for component in components:
-                project.set_dir(component)
-                project.parse_template()
-                project.save_outfile()
-                if project.parse_status != True:
-
-                    parse_status.append(project.parse_status)
+            components, deps = project.get_bundle_graph(wdir)
+            project.prefetch_rspaths(components)
+            parse_status = render_components(project, components, jobs=int(os.getenv('TB_PARSE_JOBS', os.cpu_count() or 1)))
 
             if len(parse_status) > 0:
                 print("\n".join(parse_status))
@@ -1248,26 +2955,59 @@ def main(argv=[]):
                 # we have parsed, our job here is done
                 return 0
 
+            if not args.dry and not install_pinned():
+                return -1
+
             if command == "destroy":
                 # destroy in opposite order
-                components.reverse()
+                components = list(reversed(components))
+                deps = reverse_deps(deps)
 
-            # run terragrunt per component
-            for component in components:                
+            # component -> OutputsCapture of its run
+            captures = {}
 
-                log("{} {} {}".format(PACKAGE, command, component))
-                if args.dry:
-                    continue
+            if args.dry or command == "show":
+                for component in components:
+                    log("{} {} {}".format(PACKAGE, command, component))
 
-                if command == "show":
-                    continue
+            else:
+                if args.parallelism > 1 and command in ("apply", "destroy") and not force:
+                    log("ERROR: running {} on several components at once cannot be interactive, use --force or --parallelism 1".format(command))
+                    return -1
+
+                # run terragrunt per component
+                commands = {}
+                for component in components:
+                    commands[component] = wt.get_command(command=command, wdir=component)
+
+                lock = threading.Lock()
 
-                retcode = runshow(wt.get_command(command=command, wdir=component))
+                # the outputs printed by apply make up the summary, instead of running show again
+                if command == "apply" and not args.json:
+                    for component in components:
+                        captures[component] = OutputsCapture()
 
-                if retcode != 0:
-                    log("Got a non zero return code running component {}, stopping bundle".format(component))
+                def job(component):
+                    log("{} {} {}".format(PACKAGE, command, component))
+                    if args.parallelism > 1:
+                        retcode = runprefixed(commands[component], "[{}] ".format(component), lock=lock, capture=captures.get(component))
+                    else:
+                        retcode = runshow(commands[component], capture=captures.get(component))
+                    if retcode == 0:
+                        wt.source_updated(component)
                     return retcode
 
+                results = run_dag(components, deps, job, parallelism=args.parallelism)
+
+                failed = [c for c, retcode in results.items() if retcode not in (0, None)]
+                if len(failed) > 0:
+                    for component in failed:
+                        log("Got a non zero return code running component {}".format(component))
+                    for component, retcode in results.items():
+                        if retcode == None:
+                            log("Skipped component {}, a component it depends on failed".format(component))
+                    return results[failed[0]]
+
             if command in ['apply', "show"] and not args.dry:
                 log("")
                 log("")
@@ -1284,38 +3024,33 @@ def main(argv=[]):
                     wt.set_option('-json')
                     wt.set_option('-no-color')
 
-                for component in components:
+                captured = {}
+                for component, capture in captures.items():
+                    if capture.outputs() != None:
+                        captured[component] = capture.outputs()
 
-                    out, err, retcode = run(wt.get_command(command="show", wdir=component), raise_exception_on_fail=True)
+                failed = []
+                for (component, outputs, err, retcode) in collect_outputs(wt, components, as_json=args.json, captured=captured):
+                    if retcode != 0:
+                        failed.append(retcode)
+                        sys.stderr.write("ERROR: could not read the outputs of component {}\n{}\n".format(component, err))
 
                     if args.json:
-                        d = json.loads(out)
                         out_dict.append({
                             "component" : component,
-                            "outputs" : d["values"]["outputs"]})
+                            "outputs" : outputs if retcode == 0 else None})
                     else:
-                        debug((out, err, retcode))
-
-                        lines = []
-
-                        p = False
-                        for line in out.split("\n"):
-
-                            if p:
-                                lines.append("    {}".format(line))
-                            if line.strip().startswith('Outputs:'):
-                                debug("Outputs:; p = True")
-                                p = True
-
                         txt = "| {}".format(component)
                         print("-" * int(len(txt)+3))
                         print(txt)
                         print("-" * int(len(txt)+3))
 
-                        if len(lines) > 0:
+                        if retcode != 0:
+                            print("Could not read the outputs")
+                        elif len(outputs) > 0:
                             print("  Outputs:")
                             print("")
-                            for line in lines:
+                            for line in outputs:
                                 print(line)
 
                         else:
@@ -1324,6 +3059,9 @@ def main(argv=[]):
                 if args.json:
                     print(json.dumps(out_dict, indent=4))
 
+                if len(failed) > 0:
+                    return failed[0]
+
         else:
             log("ERROR {}: this directory is neither a component nor a bundle, nothing to do".format(wdir))
             return 130
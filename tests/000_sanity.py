@@ -5,6 +5,8 @@ import json, os, sys
 import unittest
 import logging
 import yaml
+import tempfile
+import shutil
 
 path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
 pylib = os.path.abspath(path)
@@ -15,10 +17,12 @@ import tb
 class TestTbSanity(unittest.TestCase):
 
     def setUp(self):
-        pass
-        
+        self.conf_dir = tb.Utils.conf_dir
+        tb.Utils.conf_dir = tempfile.mkdtemp()
+
     def tearDown(self):
-        pass
+        shutil.rmtree(tb.Utils.conf_dir)
+        tb.Utils.conf_dir = self.conf_dir
 
     def test_bad_hclt(self):
         try:
@@ -58,10 +62,43 @@ class TestTbSanity(unittest.TestCase):
         retcode = tb.main(["tb", "parse", "mock/withvars/withvars"])
         assert retcode == 0 # all variables substituted
 
+    def test_parse_chained_vars(self):
+        project = tb.Project(dir="mock/withvars/chainvars")
+        project.parse_template()
+        assert project.parse_status == True
+        assert project.vars["a"] == "chainvars-x"
+        assert 'foo = "chainvars-x"' in project.out_string
+        assert 'n = "3"' in project.out_string
+
+    def test_parse_circular_vars(self):
+        try:
+            retcode = tb.main(["tb", "parse", "mock/withvars/cyclevars"])
+            assert False
+        except tb.ErrorParsingYmlVars as e:
+            assert "circular reference" in str(e)
+
+    def test_interpolator_single_pass(self):
+        i = tb.Interpolator({"a": "${b}", "b": "value"}, env={"b": "from env", "c": "env"})
+        # a single scan, substituted values are not substituted again
+        assert i.render("${a} ${b} ${c} ${d}") == "${b} value env ${d}"
+
+    def test_project_index_chain(self):
+        project = tb.Project(dir="mock/withvars/withvars")
+        chain = [os.path.relpath("{}/{}".format(folder, fn)) for (folder, fn) in project.get_chain() if fn.endswith((".hclt", ".yml"))]
+        assert chain == ["mock/project.yml", "mock/withvars/bundle.yml", "mock/withvars/withvars/bar.yml", "mock/withvars/withvars/inputs.hclt"]
+
     def test_showvars_withvars(self):
         retcode = tb.main(["tb", "showvars", "mock/withvars/withvars"])
         assert retcode == 0 # all variables substituted
 
+    def test_lazy_imports(self):
+        # modules that slow down startup are only imported when needed
+        code = "import sys; sys.path.append('{}'); import tb; tb.main(['tb', '--list']); print(' '.join(sys.modules))".format(pylib)
+        out, err, exitcode = tb.run("HOME={} {} -c \"{}\"".format(tb.Utils.conf_dir, sys.executable, code))
+        assert exitcode == 0
+        for m in ("git", "requests", "pyfiglet", "hcl", "fuzzywuzzy"):
+            assert m not in out.split()
+
     def test_bundle(self):
         retcode = tb.main(["tb", "parse", "mock/withvars"])
         assert retcode == 0
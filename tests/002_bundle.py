@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import threading
+import time
+import io
+import contextlib
+import tempfile
+import shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+class TestTbBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.conf_dir = tb.Utils.conf_dir
+        tb.Utils.conf_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(tb.Utils.conf_dir)
+        tb.Utils.conf_dir = self.conf_dir
+
+    def test_serial_bundle_graph(self):
+        project = tb.Project()
+        components, deps = project.get_bundle_graph("mock/withvars")
+        assert components == ["mock/withvars/withvars", "mock/withvars/withvars2"]
+        assert deps["mock/withvars/withvars"] == set()
+        assert deps["mock/withvars/withvars2"] == set(["mock/withvars/withvars"])
+
+    def test_depends_on_bundle_graph(self):
+        project = tb.Project()
+        components, deps = project.get_bundle_graph("mock/dag")
+
+        # dependencies come first, otherwise bundle order is kept
+        assert components == ["mock/dag/network", "mock/dag/disk", "mock/dag/vm", "mock/dag/dns"]
+        assert deps["mock/dag/vm"] == set(["mock/dag/network", "mock/dag/disk"])
+        assert deps["mock/dag/disk"] == set(["mock/dag/network"])
+        assert deps["mock/dag/dns"] == set()
+
+    def test_toposort_cycle(self):
+        with self.assertRaises(tb.BundleException):
+            tb.toposort(["a", "b"], {"a": set(["b"]), "b": set(["a"])})
+
+    def test_run_dag_failure_skips_dependents_only(self):
+        deps = {"a": set(), "b": set(["a"]), "c": set(["b"]), "d": set()}
+        results = tb.run_dag(["a", "b", "c", "d"], deps, lambda n: 1 if n == "b" else 0, parallelism=2)
+
+        assert results["a"] == 0
+        assert results["b"] == 1
+        assert results["c"] == None # skipped
+        assert results["d"] == 0
+
+    def test_run_dag_concurrency(self):
+        lock = threading.Lock()
+        state = {"running": 0, "max": 0}
+
+        def job(n):
+            with lock:
+                state["running"] += 1
+                state["max"] = max(state["max"], state["running"])
+            time.sleep(0.05)
+            with lock:
+                state["running"] -= 1
+            return 0
+
+        deps = {"a": set(), "b": set(), "c": set(), "d": set(["a", "b", "c"])}
+        results = tb.run_dag(["a", "b", "c", "d"], deps, job, parallelism=3)
+
+        assert list(results.values()) == [0, 0, 0, 0]
+        assert state["max"] == 3
+
+    def test_reverse_deps(self):
+        deps = tb.reverse_deps({"a": set(), "b": set(["a"])})
+        assert deps["a"] == set(["b"])
+        assert deps["b"] == set()
+
+    def test_collect_outputs(self):
+        root = tempfile.mkdtemp()
+        try:
+            # prints the outputs of the component it runs in, the earlier components being the slower ones
+            terragrunt = "{}/terragrunt".format(root)
+            with open(terragrunt, "w") as fh:
+                fh.write("\n".join([
+                    "#!/bin/sh",
+                    'while [ "$1" != "--terragrunt-working-dir" ]; do shift; done',
+                    'c=$(basename "$2")',
+                    'sleep 0.$((5 - ${c#c}))',
+                    'if [ "$c" = "c2" ]; then echo "no state for $c" >&2; exit 3; fi',
+                    'case "$*" in',
+                    '    *-json*) echo "{\\"values\\": {\\"outputs\\": {\\"name\\": {\\"value\\": \\"$c\\"}}}}" ;;',
+                    '    *) printf "resource\\nOutputs:\\n\\nname = $c\\n" ;;',
+                    'esac',
+                ]) + "\n")
+            os.chmod(terragrunt, 0o755)
+
+            components = ["{}/c{}".format(root, i) for i in range(5)]
+            wt = tb.WrapTerragrunt(terragrunt_path=terragrunt)
+            wt.set_source_update(False)
+            wt.set_option('-json')
+
+            start = time.time()
+            results = tb.collect_outputs(wt, components, as_json=True)
+            assert time.time() - start < 1.0
+
+            assert [r[0] for r in results] == components
+            assert results[0][1] == {"name": {"value": "c0"}}
+            assert (results[2][1], results[2][2], results[2][3]) == (None, "no state for c2\n", 3)
+            assert results[4][3] == 0
+
+            wt = tb.WrapTerragrunt(terragrunt_path=terragrunt)
+            wt.set_source_update(False)
+            results = tb.collect_outputs(wt, components)
+            assert results[1][1] == ["    ", "    name = c1", "    "]
+
+            # the outputs printed by apply are not shown again
+            results = tb.collect_outputs(wt, components, captured={components[2]: ["    name = applied"]})
+            assert results[2] == (components[2], ["    name = applied"], "", 0)
+            assert [r[3] for r in results] == [0, 0, 0, 0, 0]
+        finally:
+            shutil.rmtree(root)
+
+    def test_outputs_capture(self):
+        capture = tb.OutputsCapture()
+        assert capture.outputs() == None
+
+        text = "Apply complete!\n\n\x1b[0m\x1b[1m\x1b[32mOutputs:\x1b[0m\n\nid = \x1b[1mabc\x1b[0m\nname = vm"
+        for i in range(0, len(text), 3):
+            capture.feed(text[i:i+3])
+        assert capture.outputs() == ["    ", "    id = abc", "    name = vm"]
+
+    def test_runshow_capture(self):
+        capture = tb.OutputsCapture()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            retcode = tb.runshow("printf 'Plan: 1 to add\\nOutputs:\\n\\nid = abc\\n'; exit 2", capture=capture)
+
+        assert retcode == 2
+        assert out.getvalue() == "Plan: 1 to add\nOutputs:\n\nid = abc\n"
+        assert capture.outputs() == ["    ", "    id = abc"]
+
+        capture = tb.OutputsCapture()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tb.runprefixed("printf 'Outputs:\\nid = abc\\n'", "[c] ", capture=capture)
+        assert capture.outputs() == ["    id = abc"]
+
+    def test_bundle_dry_parallel(self):
+        retcode = tb.main(["tb", "plan", "mock/dag", "--dry", "--parallelism", "4"])
+        assert retcode == None
+
+    def test_bundle_destroy_keeps_graph(self):
+        # destroy walks the bundle backwards without touching the shared expansion
+        projects = []
+        class Project(tb.Project):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                projects.append(self)
+
+        saved = tb.Project
+        tb.Project = Project
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                retcode = tb.main(["tb", "destroy", "mock/dag", "--dry"])
+        finally:
+            tb.Project = saved
+
+        assert retcode == None
+        components, deps = projects[-1].get_bundle_graph("mock/dag")
+        assert components == tb.Project().get_bundle_graph("mock/dag")[0]
+
+    def test_bundle_parallel_apply_requires_force(self):
+        retcode = tb.main(["tb", "apply", "mock/dag", "--parallelism", "4"])
+        assert retcode == -1
+
+    def parse_broken_bundle(self, jobs):
+        os.environ["TB_PARSE_JOBS"] = str(jobs)
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                retcode = tb.main(["tb", "parse", "mock/brokenbundle"])
+        finally:
+            del os.environ["TB_PARSE_JOBS"]
+
+        assert retcode == 120
+        return out.getvalue()
+
+    def test_parse_bundle_reports_all_errors(self):
+        out = self.parse_broken_bundle(jobs=1)
+        assert out.index("${not_a_var}") < out.index("mock/brokenbundle/badhclt")
+        assert "mock/brokenbundle/good" not in out
+
+    def test_parse_bundle_processes(self):
+        # same report, whatever the number of processes
+        assert self.parse_broken_bundle(jobs=3) == self.parse_broken_bundle(jobs=1)
+
+
+class TestTbNestedBundles(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+
+        for c in ("net/vnet", "net/subnet", "net-old/vnet", "app/vm"):
+            self.write("{}/inputs.hclt".format(c), "inputs {}\n")
+        self.write("project.yml", "")
+        self.write("net/bundle.yml", "order:\n    - vnet\n    - subnet\n")
+        self.write("app/bundle.yml", "order:\n    - ../net\n    - vm\n")
+        self.write("all/bundle.yml", "order:\n    - ../net\n    - ../app\n")
+        self.write("loop/a/bundle.yml", "order:\n    - ../b\n")
+        self.write("loop/b/bundle.yml", "order:\n    - ../a\n")
+        self.write("stars/bundle.yml", "order:\n    - ../net*\n")
+        self.write("missing/bundle.yml", "order:\n    - nope\n")
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def write(self, path, content):
+        path = "{}/{}".format(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as fh:
+            fh.write(content)
+
+    def test_component_type(self):
+        project = tb.Project()
+        assert project.component_type("net/vnet") == "component"
+        assert project.component_type("./net/vnet") == "component"
+        assert project.component_type("net") == "bundle"
+        assert project.component_type("nope") == None
+
+    def test_nested_bundles_expanded_once(self):
+        project = tb.Project()
+        components, deps = project.get_bundle_graph("all")
+        assert components == ["net/vnet", "net/subnet", "app/vm"]
+        assert project.get_bundle_graph("app/../net") is project.get_bundle_graph("net")
+
+    def test_cycle(self):
+        with self.assertRaises(tb.BundleException) as e:
+            tb.Project().get_bundle_graph("loop/a")
+        assert "loop/a -> loop/b -> loop/a" in str(e.exception)
+
+    def test_missing_entry(self):
+        with self.assertRaises(tb.BundleException):
+            tb.Project().get_bundle_graph("missing")
+
+    def test_wildcard(self):
+        # a prefix of the path, in the order the components were found
+        components, deps = tb.Project().get_bundle_graph("stars")
+        assert components == ["net", "net/subnet", "net/vnet", "net-old/vnet"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import tempfile
+import shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+class TestTbCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.component = "{}/component".format(self.root)
+        os.makedirs(self.component)
+
+        with open("{}/project.yml".format(self.root), "w") as fh:
+            fh.write('bar: "one"\n')
+        with open("{}/inputs.hclt".format(self.component), "w") as fh:
+            fh.write('inputs {\n    foo = "${bar}"\n    home = "${TB_TEST_CACHE_ENV}"\n}\n')
+
+        os.environ["TB_TEST_CACHE_ENV"] = "env"
+
+        self.conf_dir = tb.Utils.conf_dir
+        tb.Utils.conf_dir = "{}/conf".format(self.root)
+
+    def tearDown(self):
+        tb.Utils.conf_dir = self.conf_dir
+        shutil.rmtree(self.root)
+
+    def render(self):
+        project = tb.Project(dir=self.component)
+        project.parse_template()
+        project.save_outfile()
+        return project
+
+    def test_render_cache_hit(self):
+        self.render()
+
+        check_hclt_files = tb.Project.check_hclt_files
+        def fail(project):
+            raise AssertionError("component should be served from cache")
+
+        try:
+            tb.Project.check_hclt_files = fail
+            project = self.render()
+        finally:
+            tb.Project.check_hclt_files = check_hclt_files
+
+        assert project.vars["bar"] == "one"
+        assert 'foo = "one"' in project.out_string
+
+    def test_render_cache_invalidation(self):
+        self.render()
+
+        with open("{}/project.yml".format(self.root), "w") as fh:
+            fh.write('bar: "two"\n')
+        assert 'foo = "two"' in self.render().out_string
+
+        os.environ["TB_TEST_CACHE_ENV"] = "changed"
+        assert 'home = "changed"' in self.render().out_string
+
+        # unset, then empty, then unset again: the missing var is reported every time it is unset
+        del os.environ["TB_TEST_CACHE_ENV"]
+        assert self.render().parse_status != True
+        os.environ["TB_TEST_CACHE_ENV"] = ""
+        project = self.render()
+        assert project.parse_status == True
+        assert 'home = ""' in project.out_string
+        del os.environ["TB_TEST_CACHE_ENV"]
+        assert "${TB_TEST_CACHE_ENV}" in self.render().parse_status
+
+    def test_outfile_mtime_preserved(self):
+        project = self.render()
+        os.utime(project.outfile, (1000000000, 1000000000))
+
+        assert self.render().save_outfile() == False
+        assert os.stat(project.outfile).st_mtime == 1000000000
+
+    def test_yml_parsed_once(self):
+        other = "{}/other".format(self.root)
+        os.makedirs(other)
+
+        loaded = []
+        load = tb.yaml.load
+        def counting_load(stream, Loader):
+            loaded.append(stream.name)
+            return load(stream, Loader=Loader)
+
+        project = tb.Project(dir=self.component)
+        try:
+            tb.yaml.load = counting_load
+            for d in (self.component, other):
+                project.set_dir(d)
+                project.get_yml_vars()
+                assert project.vars["bar"] == "one"
+        finally:
+            tb.yaml.load = load
+
+        assert loaded.count("{}/project.yml".format(os.path.abspath(self.root))) == 1
+
+    def test_yml_changed_on_disk(self):
+        path = "{}/project.yml".format(self.root)
+        assert tb.load_yml(path) == {"bar": "one"}
+
+        with open(path, "w") as fh:
+            fh.write('bar: "two, a longer value"\n')
+        assert tb.load_yml(path) == {"bar": "two, a longer value"}
+
+    def test_hclt_validated_once(self):
+        path = "{}/inputs.hclt".format(self.component)
+        project = tb.Project(dir=self.component)
+        project.check_hclt_file(path)
+
+        loads = tb.hcl.loads
+        def fail(s):
+            raise AssertionError("template should not be parsed again")
+
+        try:
+            tb.hcl.loads = fail
+            project.check_hclt_file(path)
+        finally:
+            tb.hcl.loads = loads
+
+    def test_rendered_error_location(self):
+        with open("{}/inputs.hclt".format(self.root), "w") as fh:
+            fh.write('remote_state {\n    backend = "local"\n}\n')
+        with open("{}/quote.yml".format(self.component), "w") as fh:
+            fh.write("quote: 'x\" = = \"y'\n")
+        with open("{}/broken.hclt".format(self.component), "w") as fh:
+            fh.write('locals {\n    a = "${quote}"\n}\n')
+
+        project = self.render()
+        try:
+            project.check_parsed_file()
+            assert False
+        except tb.HclParseException as e:
+            assert "broken.hclt, rendered line 2" in str(e)
+
+    def test_source_update_on_change(self):
+        def write(ref):
+            with open("{}/terragrunt.hcl".format(self.component), "w") as fh:
+                fh.write('terraform {\n    source = "git::https://example.com/modules.git//vm?ref=' + ref + '"\n}\n')
+
+        def command(succeeded=True):
+            wt = tb.WrapTerragrunt()
+            cmd = wt.get_command(command="plan", wdir=self.component)
+            if succeeded:
+                wt.source_updated(self.component)
+            return cmd
+
+        write("v1")
+        # the source is only recorded once a command ran successfully
+        assert "--terragrunt-source-update" in command(succeeded=False)
+        assert "--terragrunt-source-update" in command()
+        assert "--terragrunt-source-update" not in command()
+
+        write("v2")
+        assert "--terragrunt-source-update" in command()
+
+        wt = tb.WrapTerragrunt()
+        wt.set_source_update()
+        assert "--terragrunt-source-update" in wt.get_command(command="plan", wdir=self.component)
+
+    def test_source_recorded_after_success(self):
+        with open("{}/terragrunt.hcl".format(self.component), "w") as fh:
+            fh.write('terraform {\n    source = "../modules//vm"\n}\n')
+
+        def updates():
+            return "--terragrunt-source-update" in tb.WrapTerragrunt().get_command(command="show", wdir=self.component)
+
+        tb.collect_outputs(tb.WrapTerragrunt(terragrunt_path="false"), [self.component])
+        assert updates()
+
+        tb.collect_outputs(tb.WrapTerragrunt(terragrunt_path="true"), [self.component])
+        assert not updates()
+
+    def test_clean(self):
+        self.render()
+        retcode = tb.main(["tb", "--clean"])
+        assert retcode == 0
+        assert not os.path.isdir("{}/cache".format(tb.Utils.conf_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
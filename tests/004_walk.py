@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import tempfile
+import shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+class TestTbWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+
+        for d in ("a", "legacy/b", "a/scratch", "c/.terragrunt-cache/x", "c/.terraform/modules/m"):
+            os.makedirs("{}/{}".format(self.root, d))
+            with open("{}/{}/inputs.hclt".format(self.root, d), "w") as fh:
+                fh.write("inputs {}\n")
+
+        with open("{}/project.yml".format(self.root), "w") as fh:
+            fh.write("tb_ignore:\n    - legacy\n")
+        with open("{}/.tbignore".format(self.root), "w") as fh:
+            fh.write("# scratch dirs\na/scratch\n")
+
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def test_default_ignore(self):
+        found = [os.path.relpath(folder) for (folder, fn) in tb.flatwalk('.')]
+        assert "c/.terragrunt-cache/x" not in found
+        assert "c/.terraform/modules/m" not in found
+        assert "legacy/b" in found
+
+    def test_project_ignore(self):
+        project = tb.Project()
+        components = [c for (which, c, match) in project.get_components()]
+        assert components == ["a"]
+
+    def test_components_below_cwd(self):
+        os.makedirs("d/e")
+        with open("d/e/inputs.hclt", "w") as fh:
+            fh.write("inputs {}\n")
+        os.chdir("d")
+
+        # same listing whether or not the whole project was indexed first
+        project = tb.Project()
+        project.set_dir("e")
+        project.get_chain()
+        assert [c for (which, c, match) in project.get_components()] == ["e"]
+        assert [c for (which, c, match) in tb.Project().get_components()] == ["e"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import tempfile
+import shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+class TestTbRemoteState(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.component = "{}/component".format(self.root)
+        os.makedirs(self.component)
+
+        with open("{}/project.yml".format(self.root), "w") as fh:
+            fh.write('network: "rspath(net:id)"\nunused: "rspath(dns:zone)"\n')
+        with open("{}/inputs.hclt".format(self.component), "w") as fh:
+            fh.write('inputs {\n    network = "${network}"\n}\n')
+
+        self.shown = []
+        self.show = tb.RemoteStates.show
+        def show(rs, component, u=None):
+            self.shown.append(component)
+            if component == "broken":
+                raise tb.NoRemoteState("no state")
+            return {"id": {"value": "{}-id".format(component)}}
+        tb.RemoteStates.show = show
+
+        self.conf_dir = tb.Utils.conf_dir
+        tb.Utils.conf_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        tb.RemoteStates.show = self.show
+        shutil.rmtree(tb.Utils.conf_dir)
+        tb.Utils.conf_dir = self.conf_dir
+        shutil.rmtree(self.root)
+
+    def test_fetch_once(self):
+        rs = tb.RemoteStates()
+        rs.fetch(["a", "b", "a"])
+        assert rs.value("a", "id") == "a-id"
+        assert rs.value("b", "id") == "b-id"
+        assert sorted(self.shown) == ["a", "b"]
+
+    def test_fetch_keeps_successes(self):
+        rs = tb.RemoteStates()
+        try:
+            rs.fetch(["a", "broken"])
+            assert False
+        except tb.NoRemoteState:
+            pass
+        assert "a" in rs.components
+
+    def test_only_referenced_vars_resolved(self):
+        project = tb.Project(dir=self.component)
+        project.parse_template()
+
+        assert project.vars["network"] == "net-id"
+        assert project.vars["unused"] == "rspath(dns:zone)"
+        assert self.shown == ["net"]
+
+    def test_prefetch(self):
+        project = tb.Project(dir=self.component)
+        project.prefetch_rspaths([self.component])
+        assert self.shown == ["net"]
+
+        project.set_dir(self.component)
+        project.parse_template()
+        assert self.shown == ["net"]
+
+
+class TestTbStateBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.component = tempfile.mkdtemp()
+        os.makedirs("{}/state".format(self.component))
+
+        with open("{}/terragrunt.hcl".format(self.component), "w") as fh:
+            fh.write('remote_state {\n  backend = "local"\n  config = {\n    path = "state/terraform.tfstate"\n  }\n}\n')
+        with open("{}/state/terraform.tfstate".format(self.component), "w") as fh:
+            json.dump({"version": 4, "outputs": {"id": {"value": "vnet-1", "type": "string"}}}, fh)
+
+        self.run = tb.run
+        def run(cmd, *args, **kwargs):
+            raise AssertionError("terragrunt should not run: {}".format(cmd))
+        tb.run = run
+
+    def tearDown(self):
+        tb.run = self.run
+        shutil.rmtree(self.component)
+
+    def test_local_backend(self):
+        rs = tb.RemoteStates(ttl=0)
+        assert rs.value(self.component, "id") == "vnet-1"
+
+    def test_unknown_backend_falls_back(self):
+        with open("{}/terragrunt.hcl".format(self.component), "w") as fh:
+            fh.write('remote_state {\n  backend = "azurerm"\n  config = {}\n}\n')
+
+        assert tb.RemoteStates(ttl=0).read_backend(self.component) == None
+
+
+class TestTbJsonMember(unittest.TestCase):
+
+    doc = {
+        "format_version": "1.0",
+        "values": {
+            "root_module": {"resources": [{"values": {"outputs": "}{][", "tags": {"a\\\"}": "\u00e9"}}}]},
+            "outputs": {"id": {"value": "x \\\" {"}, "list": {"value": [1, 2.5, True, None]}},
+        },
+        "outputs": {"top": {}},
+    }
+
+    def test_every_split(self):
+        data = json.dumps(self.doc).encode('utf-8')
+        for i in range(len(data)):
+            assert tb.json_member([data[:i], data[i:]], ["values", "outputs"]) == self.doc["values"]["outputs"]
+
+    def test_byte_by_byte(self):
+        data = json.dumps(self.doc, indent=2, ensure_ascii=False).encode('utf-8')
+        chunks = [data[i:i+1] for i in range(len(data))]
+        assert tb.json_member(chunks, ["values", "outputs"]) == self.doc["values"]["outputs"]
+        assert tb.json_member(chunks, ["outputs"]) == {"top": {}}
+        assert tb.json_member(chunks, []) == self.doc
+
+    def test_missing(self):
+        assert tb.json_member([b'{"format_version": "1.0"}'], ["values", "outputs"]) == None
+        assert tb.json_member([b'{"values": {"root_module": {"outputs": {}}}}'], ["values", "outputs"]) == None
+        assert tb.json_member([b'No state.'], ["values", "outputs"]) == None
+
+    def test_run_json(self):
+        root = tempfile.mkdtemp()
+        try:
+            with open("{}/state.json".format(root), "w") as fh:
+                json.dump(self.doc, fh)
+            (value, err, exitcode) = tb.run_json("cat {}/state.json; echo done >&2".format(root), ["values", "outputs"])
+            assert value == self.doc["values"]["outputs"]
+            assert (err, exitcode) == ("done\n", 0)
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    unittest.main()
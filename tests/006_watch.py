@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import tempfile
+import shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+class TestTbWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+
+        for c in ("a", "b"):
+            os.makedirs("{}/{}".format(self.root, c))
+            self.write("{}/inputs.hclt".format(c), 'inputs {\n    foo = "${bar}"\n}\n')
+
+        self.write("project.yml", 'bar: "one"\n')
+        os.chdir(self.root)
+
+        self.conf_dir = tb.Utils.conf_dir
+        tb.Utils.conf_dir = tempfile.mkdtemp()
+
+        self.watcher = tb.Watcher(tb.Project(), '.')
+        self.start()
+        self.watcher.render(self.watcher.components())
+
+    def tearDown(self):
+        self.watcher.stop_inotify()
+        os.chdir(self.cwd)
+        shutil.rmtree(tb.Utils.conf_dir)
+        tb.Utils.conf_dir = self.conf_dir
+        shutil.rmtree(self.root)
+
+    def start(self):
+        self.watcher.files = self.watcher.snapshot()
+
+    def changes(self):
+        return self.watcher.poll()
+
+    def write(self, path, content):
+        with open("{}/{}".format(self.root, path), "w") as fh:
+            fh.write(content)
+
+    def rendered(self, component):
+        with open("{}/{}/terragrunt.hcl".format(self.root, component), "r") as fh:
+            return fh.read()
+
+    def test_nothing_changed(self):
+        assert self.changes() == []
+
+    def test_component_change(self):
+        self.write("a/a.yml", 'bar: "a"\n')
+        assert self.changes() == ["a"]
+        assert 'foo = "a"' in self.rendered("a")
+        assert 'foo = "one"' in self.rendered("b")
+
+    def test_root_change(self):
+        self.write("a/a.yml", 'bar: "a"\n')
+        self.changes()
+
+        self.write("project.yml", 'bar: "three"\n')
+        assert self.changes() == ["a", "b"]
+        assert 'foo = "a"' in self.rendered("a")
+        assert 'foo = "three"' in self.rendered("b")
+
+    def test_new_component(self):
+        os.makedirs("{}/c".format(self.root))
+        self.write("c/inputs.hclt", 'inputs {\n    foo = "${bar}"\n}\n')
+        assert self.changes() == ["c"]
+        assert 'foo = "one"' in self.rendered("c")
+
+    def test_ignored_dir(self):
+        self.write(".tbignore", "scratch\n")
+        self.watcher.project.ignore = {}
+        os.makedirs("{}/scratch".format(self.root))
+        self.write("scratch/inputs.hclt", 'inputs {}\n')
+        assert self.changes() == []
+        assert not any("scratch" in f for f in self.watcher.files)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is only available on linux")
+class TestTbWatchInotify(TestTbWatch):
+    # same changes, picked up from inotify events instead of walking the tree
+
+    def start(self):
+        self.watcher.inotify = tb.Inotify()
+        self.watcher.files = self.watcher.snapshot()
+
+    def changes(self):
+        return self.watcher.watch(timeout=0.5)
+
+    def test_watched_dirs(self):
+        assert sorted(self.watcher.inotify.dirs.values()) == [self.root, self.root + "/a", self.root + "/b"]
+
+    def test_moved_component(self):
+        os.rename("{}/b".format(self.root), "{}/c".format(self.root))
+        assert self.changes() == ["c"]
+        assert not any(f.startswith(self.root + "/b/") for f in self.watcher.files)
+
+        # events from the moved directory come under its new path
+        self.write("c/c.yml", 'bar: "c"\n')
+        assert self.changes() == ["c"]
+        assert 'foo = "c"' in self.rendered("c")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import tempfile
+import shutil
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+class Releases(BaseHTTPRequestHandler):
+    # stands in for github and releases.hashicorp.com
+
+    requests = []
+
+    def do_GET(self):
+        Releases.requests.append(self.path)
+
+        if self.path == "/terragrunt/releases/latest":
+            self.send_response(302)
+            self.send_header("Location", "/terragrunt/releases/tag/v0.99.1")
+            self.end_headers()
+            return
+
+        if self.path == "/terraform/index.json":
+            if self.headers.get("If-None-Match") == '"index-1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            versions = {}
+            for v in ("0.12.9", "0.12.10", "0.13.0-rc1", "0.9.99"):
+                versions[v] = {"name": "terraform", "version": v, "builds": [{"version": v, "os": "linux"}]}
+            body = json.dumps({"name": "terraform", "versions": versions})
+
+            self.send_response(200)
+            self.send_header("ETag", '"index-1"')
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+            return
+
+        if self.path == "/terraform/empty.json":
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'{"name": "terraform", "versions": {}}')
+            return
+
+        self.send_response(404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class TestTbVersions(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), Releases)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:{}".format(self.server.server_port)
+
+        self.saved = (tb.Utils.conf_dir, tb.Utils.terragrunt_latest_url, tb.Utils.terraform_index_url)
+        tb.Utils.conf_dir = tempfile.mkdtemp()
+        tb.Utils.terragrunt_latest_url = url + "/terragrunt/releases/latest"
+        tb.Utils.terraform_index_url = url + "/terraform/index.json"
+        Releases.requests = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(tb.Utils.conf_dir)
+        (tb.Utils.conf_dir, tb.Utils.terragrunt_latest_url, tb.Utils.terraform_index_url) = self.saved
+
+    def test_latest_versions(self):
+        u = tb.Utils(terraform_path="none", terragrunt_path="none")
+        assert u.terragrunt_currentversion()[0] == "v0.99.1"
+        assert u.terraform_currentversion()[0] == "0.12.10"
+
+    def test_latest_versions_cached(self):
+        tb.Utils(terraform_path="none", terragrunt_path="none").terraform_currentversion()
+        tb.Utils(terraform_path="none", terragrunt_path="none").terragrunt_currentversion()
+        count = len(Releases.requests)
+
+        u = tb.Utils(terraform_path="none", terragrunt_path="none")
+        assert u.terraform_currentversion()[0] == "0.12.10"
+        assert u.terragrunt_currentversion()[0] == "v0.99.1"
+        assert len(Releases.requests) == count
+
+    def test_terraform_index_not_modified(self):
+        # the index has not changed since the last response, its latest version is reused
+        tb.Cache("versions").set("terraform-index", {"latest": "0.12.8", "etag": '"index-1"'})
+        u = tb.Utils(terraform_path="none", terragrunt_path="none")
+        assert u.terraform_currentversion()[0] == "0.12.8"
+        assert Releases.requests == ["/terraform/index.json"]
+
+    def test_terraform_index_without_latest(self):
+        # a cached index without a version is not sent as a conditional request
+        tb.Cache("versions").set("terraform-index", {"latest": None, "etag": '"index-1"'})
+        u = tb.Utils(terraform_path="none", terragrunt_path="none")
+        assert u.terraform_currentversion()[0] == "0.12.10"
+
+    def test_terraform_index_empty(self):
+        tb.Utils.terraform_index_url = tb.Utils.terraform_index_url.replace("index.json", "empty.json")
+        u = tb.Utils(terraform_path="none", terragrunt_path="none")
+        with self.assertRaises(tb.DownloadException):
+            u.terraform_currentversion()
+        assert tb.Cache("versions").get("terraform-latest") == None
+        assert tb.Cache("versions").get("terraform-index") == None
+
+    def test_latest_version(self):
+        assert tb.latest_version(["0.9.99", "0.12.10", "0.12.9", "0.13.0-rc1", "0.13.0-beta"]) == "0.12.10"
+        assert tb.latest_version(["rc"]) == None
+
+    def test_scan_versions(self):
+        index = json.dumps({"versions": {"0.1.0": {"version": "0.1.0"}, "0.11.14": {"version": "0.11.14"}}}).encode('utf-8')
+        # every possible split of the document
+        for i in range(len(index)):
+            assert list(tb.scan_versions([index[:i], index[i:]])) == ["0.1.0", "0.11.14"]
+
+    def test_autocheck_does_not_wait(self):
+        bin_dir = os.path.dirname(os.path.realpath(__file__))+'/bin'
+        u = tb.Utils(terraform_path=bin_dir+'/mock_terraform_outdated', terragrunt_path=bin_dir+'/mock_terragrunt_outdated')
+
+        started = []
+        u.start_check_updates = lambda: started.append(True)
+
+        u.autocheck()
+        assert started == [True]
+        assert Releases.requests == []
+
+        # the next run reports what the background check found, without starting another one
+        assert u.check_updates() == 0
+        assert tb.Cache("versions").get(u.updates_key()) == ["terraform", "terragrunt"]
+        u.autocheck()
+        assert started == [True]
+
+    def test_check_updates_conf_dir(self):
+        # the background check writes to the conf dir of the process which started it
+        started = []
+        popen = tb.Popen
+        tb.Popen = lambda args, **kwargs: started.append(kwargs["env"])
+        try:
+            tb.Utils(terraform_path="none", terragrunt_path="none").start_check_updates()
+        finally:
+            tb.Popen = popen
+        assert started[0]["TB_CONF_DIR"] == tb.Utils.conf_dir
+
+        code = "import sys; sys.path.append('{}'); import tb; print(tb.Utils.conf_dir)".format(pylib)
+        out, err, exitcode = tb.run("TB_CONF_DIR={} {} -c \"{}\"".format(tb.Utils.conf_dir, sys.executable, code))
+        assert out.strip() == tb.Utils.conf_dir
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys, io
+import unittest
+import tempfile
+import shutil
+import threading
+import hashlib
+import zipfile
+import contextlib
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+def terraform_zip(content):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr("terraform", content)
+    return buf.getvalue()
+
+class Releases(BaseHTTPRequestHandler):
+    # stands in for releases.hashicorp.com and github, with support for ranges
+
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        Releases.requests.append((self.path, self.headers.get("Range")))
+
+        if self.path not in Releases.files:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = Releases.files[self.path]
+        start = 0
+        if self.headers.get("Range") != None:
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(body):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+class TestTbInstall(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), Releases)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:{}".format(self.server.server_port)
+
+        self.zip = terraform_zip("#!/bin/sh\necho terraform\n" * 1000)
+        self.terragrunt = b"#!/bin/sh\necho terragrunt\n"
+        Releases.files = {
+            "/terraform/0.12.10/terraform_0.12.10_linux_amd64.zip": self.zip,
+            "/terraform/0.12.10/terraform_0.12.10_SHA256SUMS": "{}  terraform_0.12.10_linux_amd64.zip\n".format(hashlib.sha256(self.zip).hexdigest()).encode('utf-8'),
+            "/terragrunt/v0.99.1/terragrunt_linux_amd64": self.terragrunt,
+        }
+        Releases.requests = []
+
+        self.saved = (tb.Utils.conf_dir, tb.Utils.bin_dir, tb.Utils.terraform_releases_url, tb.Utils.terragrunt_download_url)
+        tb.Utils.conf_dir = tempfile.mkdtemp()
+        tb.Utils.bin_dir = tb.Utils.conf_dir + "/bin"
+        tb.Utils.terraform_releases_url = self.url + "/terraform"
+        tb.Utils.terragrunt_download_url = self.url + "/terragrunt"
+
+        self.u = tb.Utils(terraform_path=tb.Utils.conf_dir+"/terraform", terragrunt_path=tb.Utils.conf_dir+"/terragrunt")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(tb.Utils.conf_dir)
+        (tb.Utils.conf_dir, tb.Utils.bin_dir, tb.Utils.terraform_releases_url, tb.Utils.terragrunt_download_url) = self.saved
+
+    def test_install_terraform(self):
+        self.u.install_terraform("0.12.10")
+        with open(self.u.terraform_path, 'rb') as fh:
+            assert fh.read().startswith(b"#!/bin/sh\necho terraform\n")
+        assert os.access(self.u.terraform_path, os.X_OK)
+
+        # installing again is served from the download cache, which tb --clean keeps
+        tb.Cache.clear()
+        count = len(Releases.requests)
+        self.u.install_terraform("0.12.10")
+        assert len(Releases.requests) == count
+
+    def test_install_terragrunt_without_checksums(self):
+        self.u.install_terragrunt("v0.99.1")
+        with open(self.u.terragrunt_path, 'rb') as fh:
+            assert fh.read() == self.terragrunt
+
+    def test_pinned_versions(self):
+        root = tb.Utils.conf_dir + "/project"
+        os.makedirs(root)
+        with open(root + "/project.yml", "w") as fh:
+            fh.write('terraform_version: "0.12.10"\nterragrunt_version: "0.99.1"\n')
+
+        u = tb.Utils(project_root=root)
+        assert u.terraform_path == u.bin_dir + "/versions/terraform/0.12.10/terraform"
+        assert u.terragrunt_path == u.bin_dir + "/versions/terragrunt/v0.99.1/terragrunt"
+
+        u.install_pinned()
+        assert os.access(u.terraform_path, os.X_OK)
+        assert os.access(u.terragrunt_path, os.X_OK)
+
+        # already installed, nothing is downloaded
+        count = len(Releases.requests)
+        tb.Utils(project_root=root).install_pinned()
+        assert len(Releases.requests) == count
+
+    def test_pins_installed_before_terragrunt_only(self):
+        root = tb.Utils.conf_dir + "/project"
+        os.makedirs(root + "/component")
+        with open(root + "/project.yml", "w") as fh:
+            fh.write('terraform_version: "0.12.11"\n')
+        with open(root + "/component/inputs.hclt", "w") as fh:
+            fh.write('inputs {}\n')
+
+        cwd = os.getcwd()
+        start_check_updates = tb.Utils.start_check_updates
+        tb.Utils.start_check_updates = lambda u: None
+        try:
+            os.chdir(root)
+            # nothing is downloaded for commands which do not run terragrunt
+            assert tb.main(["tb", "--list"]) == 0
+            assert tb.main(["tb", "parse", "component", "--no-check-git"]) == 0
+            assert Releases.requests == []
+
+            # 0.12.11 cannot be downloaded, which is reported without a traceback
+            err = io.StringIO()
+            with contextlib.redirect_stderr(err):
+                retcode = tb.main(["tb", "plan", "component", "--no-check-git", "--allow-no-remote-state"])
+            assert retcode == -1
+            assert err.getvalue().startswith("ERROR: no checksum for terraform 0.12.11")
+        finally:
+            os.chdir(cwd)
+            tb.Utils.start_check_updates = start_check_updates
+
+    def test_resume(self):
+        filename = tb.Utils.conf_dir + "/terraform.zip"
+        with open(filename + ".part", 'wb') as fh:
+            fh.write(self.zip[0:100])
+
+        tb.Utils.download_progress(self.url + "/terraform/0.12.10/terraform_0.12.10_linux_amd64.zip", filename, sha256=hashlib.sha256(self.zip).hexdigest())
+        assert Releases.requests[-1][1] == "bytes=100-"
+        with open(filename, 'rb') as fh:
+            assert fh.read() == self.zip
+
+    def test_checksum_mismatch(self):
+        Releases.files["/terraform/0.12.10/terraform_0.12.10_linux_amd64.zip"] = terraform_zip("tampered")
+        try:
+            self.u.install_terraform("0.12.10")
+            assert False
+        except tb.DownloadException:
+            pass
+        assert not os.path.exists(self.u.terraform_path)
+
+    def test_terraform_without_checksums(self):
+        # terraform releases always publish checksums, without them nothing is installed
+        del Releases.files["/terraform/0.12.10/terraform_0.12.10_SHA256SUMS"]
+        with self.assertRaises(tb.DownloadException):
+            self.u.install_terraform("0.12.10")
+        assert not os.path.exists(self.u.terraform_path)
+
+    def test_terraform_not_in_checksums(self):
+        Releases.files["/terraform/0.12.10/terraform_0.12.10_SHA256SUMS"] = b"0123  terraform_0.12.10_darwin_amd64.zip\n"
+        with self.assertRaises(tb.DownloadException):
+            self.u.install_terraform("0.12.10")
+        assert not os.path.exists(self.u.terraform_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import tempfile
+import shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+
+def git(cwd, args):
+    cmd = "git -C {} -c user.name=tb -c user.email=tb@example.com -c init.defaultBranch=master {}".format(cwd, args)
+    return tb.run(cmd, raise_exception_on_fail=True)[0]
+
+def commit(cwd, name):
+    with open("{}/{}".format(cwd, name), "w") as fh:
+        fh.write(name)
+    git(cwd, "add {}".format(name))
+    git(cwd, "commit -q -m {}".format(name))
+
+class TestTbGit(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.origin = "{}/origin.git".format(self.root)
+        self.work = "{}/work".format(self.root)
+        self.other = "{}/other".format(self.root)
+
+        git(self.root, "init -q --bare {}".format(self.origin))
+        git(self.root, "clone -q {} {}".format(self.origin, self.work))
+        commit(self.work, "first")
+        git(self.work, "push -q origin HEAD:master")
+        git(self.work, "branch -q -u origin/master")
+        git(self.root, "clone -q {} {}".format(self.origin, self.other))
+
+        self.saved = (tb.Utils.conf_dir, tb.git_fetch)
+        tb.Utils.conf_dir = "{}/conf".format(self.root)
+
+    def tearDown(self):
+        (tb.Utils.conf_dir, tb.git_fetch) = self.saved
+        shutil.rmtree(self.root)
+
+    def push_from_other(self):
+        commit(self.other, "second")
+        git(self.other, "push -q origin master")
+
+    def test_git_rootdir(self):
+        os.makedirs("{}/a/b".format(self.work))
+        assert os.path.abspath(tb.git_rootdir("{}/a/b".format(self.work))) == self.work
+
+    def test_up_to_date(self):
+        status = tb.git_status(self.work)
+        assert status["branch"] == "master"
+        assert status["branches"]["master"] == {"upstream": "origin/master", "ahead": 0, "behind": 0}
+        assert tb.git_check(self.work) == 0
+
+    def test_behind(self):
+        commit(self.other, "second")
+        git(self.other, "push -q origin master")
+
+        assert tb.git_check(self.work) == -1
+        assert tb.git_status(self.work)["branches"]["master"]["behind"] == 1
+
+    def test_ahead(self):
+        commit(self.work, "second")
+        assert tb.git_status(self.work)["branches"]["master"]["ahead"] == 1
+        assert tb.git_check(self.work) == 0
+
+    def test_no_upstream(self):
+        git(self.work, "checkout -q -b feature")
+        assert tb.git_status(self.work)["branches"]["feature"]["upstream"] == None
+        assert tb.git_check(self.work) == 0
+
+    def test_feature_branch_up_to_date(self):
+        git(self.work, "checkout -q -b feature")
+        git(self.work, "push -q -u origin feature")
+        assert tb.git_check(self.work) == 0
+
+        assert tb.ahead_behind(self.work, "feature", "origin/master") == (0, 0)
+        assert tb.ahead_behind(self.work, "feature", "origin/missing") == None
+
+    def test_fetch_interval(self):
+        tb.git_fetch(self.work)
+        self.push_from_other()
+
+        # fetched less than a minute ago, the new commit is not seen yet
+        assert tb.git_check(self.work, fetch_interval=60) == 0
+        assert tb.git_check(self.work, fetch_interval=0) == -1
+
+    def test_no_fetch(self):
+        self.push_from_other()
+        assert tb.git_check(self.work, fetch_interval=-1) == 0
+
+    def test_fetch_all_remotes(self):
+        mirror = "{}/mirror.git".format(self.root)
+        git(self.root, "clone -q --bare {} {}".format(self.origin, mirror))
+        git(self.work, "remote add mirror {}".format(mirror))
+        self.push_from_other()
+        git(self.other, "push -q {} master".format(mirror))
+
+        tb.git_fetch(self.work)
+        assert git(self.work, "rev-parse origin/master") == git(self.work, "rev-parse mirror/master")
+
+    def test_background_fetch(self):
+        fetch = tb.git_fetch
+        started = []
+        tb.git_fetch = lambda git_root, background=False: started.append(background)
+        self.push_from_other()
+
+        # the verdict does not wait for the fetch, and a single fetch is started
+        assert tb.git_check(self.work, fetch_interval=0, background=True) == 0
+        assert tb.git_check(self.work, fetch_interval=60, background=True) == 0
+        assert started == [True]
+
+        # the next run sees what the background fetch brought
+        fetch(self.work, background=True).wait()
+        assert tb.git_check(self.work, fetch_interval=60, background=True) == -1
+
+class TestTbGitFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+
+        for d in ("a", "ab", "b/c", "legacy"):
+            os.makedirs("{}/{}".format(self.root, d))
+            with open("{}/{}/inputs.hclt".format(self.root, d), "w") as fh:
+                fh.write("inputs {}\n")
+
+        with open("{}/project.yml".format(self.root), "w") as fh:
+            fh.write("tb_ignore:\n    - legacy\n")
+
+        git(self.root, "init -q")
+        git(self.root, "add -A")
+        git(self.root, "commit -q -m first")
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def matches(self):
+        return dict((c, match) for (which, c, match) in tb.Project(git_filtered=True).get_components())
+
+    def test_nothing_changed(self):
+        assert self.matches() == {"a": False, "ab": False, "b/c": False}
+
+    def test_changed_file(self):
+        commit(self.root + "/b/c", "vars.yml")
+        with open("a/inputs.hclt", "a") as fh:
+            fh.write("\n")
+        assert self.matches() == {"a": True, "ab": False, "b/c": False}
+
+    def test_untracked_directory(self):
+        os.makedirs("d/e")
+        with open("d/e/inputs.hclt", "w") as fh:
+            fh.write("inputs {}\n")
+        assert self.matches()["d/e"] == True
+        assert tb.git_changes(".") == [self.root + "/d/"]
+
+    def test_ignored_changes(self):
+        os.makedirs("ab/.terraform/modules")
+        with open("ab/.terraform/modules/modules.json", "w") as fh:
+            fh.write("{}")
+        with open("legacy/inputs.hclt", "a") as fh:
+            fh.write("\n")
+        assert self.matches() == {"a": False, "ab": False, "b/c": False}
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sys
+import unittest
+import random
+import tempfile
+import shutil
+import io
+import contextlib
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../tb'
+pylib = os.path.abspath(path)
+sys.path.append(pylib)
+
+import tb
+from fuzzywuzzy import fuzz
+
+class TestTbSuggest(unittest.TestCase):
+
+    def test_same_as_ratio(self):
+        rnd = random.Random(1)
+        names = ["".join(rnd.choice("abcde_") for i in range(rnd.randint(1, 12))) for n in range(300)]
+        suggestions = tb.Suggestions(names)
+
+        for miss in names[0:50] + ["${" + n + "}" for n in names[50:100]]:
+            expected = [n for n in dict.fromkeys(names) if fuzz.ratio(miss, n) >= 80]
+            assert suggestions.get(miss) == expected
+
+    def test_check_parsed_text(self):
+        project = tb.Project()
+        project.vars = {"location_name": "westeurope", "resource_group": "rg"}
+
+        text = '\n'.join([
+            'a = "${location_nam}"',
+            '# b = "${location_nam}"',
+            '',
+            'c = "${location_nam}-${unknown}"',
+        ])
+        msg = project.check_parsed_text(text)
+
+        assert msg.count("No substitution found for ${location_nam}") == 2
+        assert msg.count("No substitution found for ${unknown}") == 1
+        assert msg.count("Perhaps you meant ${location_name}?") == 2
+        assert msg.startswith("line 1:")
+        assert "line 2:" not in msg
+        assert project.check_parsed_text('a = "westeurope"') == ""
+
+    def test_index_shared_by_yml_vars(self):
+        root = tempfile.mkdtemp()
+        try:
+            with open("{}/project.yml".format(root), "w") as fh:
+                fh.write('location_name: "westeurope"\na: "${location_nam}"\nb: "${location_nme}"\n')
+
+            built = []
+            class Suggestions(tb.Suggestions):
+                def __init__(self, names):
+                    super().__init__(names)
+                    built.append(self)
+
+            saved = tb.Suggestions
+            tb.Suggestions = Suggestions
+            try:
+                project = tb.Project(dir=root)
+                with contextlib.redirect_stderr(io.StringIO()) as err:
+                    with self.assertRaises(tb.ErrorParsingYmlVars):
+                        project.get_yml_vars()
+            finally:
+                tb.Suggestions = saved
+
+            assert err.getvalue().count("Perhaps you meant ${location_name}?") == 2
+            assert len(built) == 1
+            assert project.get_suggestions() is built[0]
+
+            # another component gets its own index
+            project.set_dir(root)
+            assert project.suggestions == None
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+git_check() latency on a repository with many files, on a feature branch: the git commands the former
+git_check() ran (GitPython's branch -r, three rev-list, branch -vv | grep) against tb.git_check
+'''
+
+import os, sys, time
+import tempfile, shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+sys.path.append(os.path.abspath(path))
+
+import tb
+
+def git(cwd, args):
+    cmd = "git -C {} -c user.name=tb -c user.email=tb@example.com -c init.defaultBranch=master {}".format(cwd, args)
+    return tb.run(cmd, raise_exception_on_fail=True)[0]
+
+def fixture(root, nfiles):
+    origin = "{}/origin.git".format(root)
+    work = "{}/work".format(root)
+    git(root, "init -q --bare {}".format(origin))
+    git(root, "clone -q {} {}".format(origin, work))
+
+    for i in range(nfiles):
+        d = "{}/dir{}".format(work, i % 100)
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        with open("{}/file{}.hclt".format(d, i), "w") as fh:
+            fh.write("inputs {}\n")
+
+    git(work, "add -A")
+    git(work, "commit -q -m fixture")
+    git(work, "push -q origin HEAD:master")
+    git(work, "checkout -q -b feature")
+    git(work, "push -q -u origin feature")
+    return work
+
+def legacy(work):
+    git(work, "rev-parse --abbrev-ref HEAD")
+    git(work, "branch -r")
+    tb.run("git -C {} rev-list --left-right --count \"feature...origin/feature\"".format(work))
+    tb.run("git -C {} branch -vv | grep master ".format(work))
+    tb.run("git -C {} rev-list --left-right --count \"feature...origin/master\"".format(work))
+    tb.run("git -C {} rev-list --left-right --count \"feature...master\"".format(work))
+
+def timeit(f, work, runs=5):
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        f(work)
+        t = time.perf_counter() - start
+        if best == None or t < best:
+            best = t
+    return best
+
+if __name__ == '__main__':
+    print("{:>8} {:>12} {:>12}".format("files", "legacy (s)", "git_check (s)"))
+    for nfiles in (1000, 10000, 50000):
+        root = tempfile.mkdtemp()
+        try:
+            work = fixture(root, nfiles)
+            # recent enough for git_check not to fetch
+            with open("{}/.git/FETCH_HEAD".format(work), "w") as fh:
+                pass
+            print("{:>8} {:>12.4f} {:>12.4f}".format(nfiles, timeit(legacy, work), timeit(tb.git_check, work)))
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+validation time vs template size: the former check (hcl.load of every template, then hcl.loads of
+the rendered output) against tb.Project, whose template checks are cached on content
+'''
+
+import os, sys, time
+import tempfile, shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+sys.path.append(os.path.abspath(path))
+
+import tb
+import hcl
+
+def fixture(root, ntemplates, nlines):
+    component = "{}/component".format(root)
+    os.makedirs(component)
+
+    with open("{}/project.yml".format(root), "w") as fh:
+        fh.write('bar: "value"\n')
+    with open("{}/remote_state.hclt".format(root), "w") as fh:
+        fh.write('remote_state {\n    backend = "local"\n}\n')
+
+    for t in range(ntemplates):
+        lines = ['    key{} = "${{bar}}-{}"'.format(i, i) for i in range(nlines)]
+        with open("{}/inputs{}.hclt".format(component, t), "w") as fh:
+            fh.write("locals {\n" + "\n".join(lines) + "\n}\n")
+
+    return component
+
+def legacy(project):
+    for f in project.get_files():
+        with open(f, 'r') as fp:
+            hcl.load(fp)
+    hcl.loads(project.out_string)
+
+def cached(project):
+    project.check_hclt_files()
+    project.check_parsed_file()
+
+def timeit(f, project):
+    start = time.perf_counter()
+    f(project)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    conf_dir = tb.Utils.conf_dir
+    print("{:>10} {:>8} {:>12} {:>12}".format("templates", "lines", "legacy (s)", "cached (s)"))
+    for ntemplates in (1, 5):
+        for nlines in (100, 1000, 5000):
+            root = tempfile.mkdtemp()
+            try:
+                tb.Utils.conf_dir = root
+                project = tb.Project(dir=fixture(root, ntemplates, nlines))
+                project.parse_template()
+
+                t_legacy = timeit(legacy, project)
+                cached(project) # first run validates the templates
+                t_cached = timeit(cached, project)
+                print("{:>10} {:>8} {:>12.4f} {:>12.4f}".format(ntemplates, nlines, t_legacy, t_cached))
+            finally:
+                tb.Utils.conf_dir = conf_dir
+                shutil.rmtree(root)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+resolving the hclt/yml files of every component of a large synthetic project: the former
+flatwalk_up() (a full walk of the project per call, two calls per component) against tb.ProjectIndex
+'''
+
+import os, sys, time
+import tempfile, shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+sys.path.append(os.path.abspath(path))
+
+import tb
+
+def flatwalk_up(haystack, needle):
+    results = []
+    spl = needle.split("/")
+    needle_parts = [spl.pop(0)]
+    for s in spl:
+        needle_parts.append("/".join([needle_parts[-1],s]))
+
+    for (folder, fn) in tb.flatwalk(haystack):
+        for n in needle_parts:
+            if folder.endswith(n):
+                results.append((folder, fn))
+                break
+        if folder == haystack:
+            results.append((folder, fn))
+    return results
+
+def make_tree(root, envs=4, groups=10, components=10, noise=20):
+    touch = lambda p, data="": open(p, "w").write(data)
+    touch("{}/project.yml".format(root), "project: bench\n")
+    touch("{}/remote_state.hclt".format(root), "remote_state {}\n")
+    paths = []
+    for e in range(envs):
+        for g in range(groups):
+            for c in range(components):
+                d = "{}/env{}/group{}/component{}".format(root, e, g, c)
+                os.makedirs("{}/.terraform/plugins".format(d))
+                for n in range(noise):
+                    touch("{}/.terraform/plugins/provider{}".format(d, n))
+                touch("{}/inputs.hclt".format(d), "inputs {}\n")
+                touch("{}/vars.yml".format(d), "name: c{}\n".format(c))
+                paths.append(os.path.relpath(d, root))
+        touch("{}/env{}/env.yml".format(root, e), "env: env{}\n".format(e))
+    return paths
+
+if __name__ == '__main__':
+    root = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        components = make_tree(root)
+        os.chdir(root)
+        print("{} components, {} directories".format(len(components), sum(1 for w in os.walk(root))))
+
+        start = time.perf_counter()
+        legacy = {}
+        for c in components:
+            files = [f for f in flatwalk_up(root, c) if f[1].endswith(".hclt")]
+            legacy[c] = files + [f for f in flatwalk_up(root, c) if f[1].endswith(".yml")]
+        print("flatwalk_up x2 per component: {:.3f}s".format(time.perf_counter() - start))
+
+        start = time.perf_counter()
+        project = tb.Project()
+        indexed = {}
+        for c in components:
+            project.set_dir(c)
+            chain = project.get_chain()
+            indexed[c] = [f for f in chain if f[1].endswith(".hclt")] + [f for f in chain if f[1].endswith(".yml")]
+        print("ProjectIndex:                 {:.3f}s".format(time.perf_counter() - start))
+
+        for c in components:
+            assert sorted(set(legacy[c])) == sorted(indexed[c])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+parse time vs number of vars and template size: the former parsetext() (one str.replace per var
+and per env var, ten passes over the vars) against tb.Interpolator
+'''
+
+import os, sys, time
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+sys.path.append(os.path.abspath(path))
+
+import tb
+
+def legacy_parsetext(s, vars, env):
+    for (k, v) in vars.items():
+        s = s.replace('${' + k + '}', v)
+    for (k, v) in env.items():
+        s = s.replace('${' + k + '}', v)
+    return s
+
+def legacy(vars, env, template):
+    for i in range(10):
+        for k, v in vars.items():
+            if "${" in v:
+                vars[k] = legacy_parsetext(v, vars, env)
+    return legacy_parsetext(template, vars, env)
+
+def engine(vars, env, template):
+    i = tb.Interpolator(vars, env=env)
+    i.resolve()
+    return i.render(template)
+
+def fixture(nvars, nlines, nenv=300):
+    vars = {}
+    for i in range(nvars):
+        # every other var refers to the previous one
+        vars["var{}".format(i)] = "${{var{}}}-x".format(i-1) if i % 2 and i > 0 else "value{}".format(i)
+    env = {"ENV_VAR_{}".format(i): "env{}".format(i) for i in range(nenv)}
+    lines = ['    key{} = "${{var{}}} ${{ENV_VAR_{}}}"'.format(i, i % nvars, i % nenv) for i in range(nlines)]
+    return vars, env, "inputs {\n" + "\n".join(lines) + "\n}\n"
+
+def timeit(f, vars, env, template):
+    start = time.perf_counter()
+    out = f(dict(vars), env, template)
+    return time.perf_counter() - start, out
+
+if __name__ == '__main__':
+    print("{:>8} {:>8} {:>12} {:>12}".format("vars", "lines", "legacy (s)", "engine (s)"))
+    for nvars in (10, 100, 500):
+        for nlines in (100, 1000, 5000):
+            vars, env, template = fixture(nvars, nlines)
+            t_legacy, out_legacy = timeit(legacy, vars, env, template)
+            t_engine, out_engine = timeit(engine, vars, env, template)
+            assert out_legacy == out_engine
+            print("{:>8} {:>8} {:>12.4f} {:>12.4f}".format(nvars, nlines, t_legacy, t_engine))
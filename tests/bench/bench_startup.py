@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+wall time of a few commands that should start fast, each run in a fresh interpreter,
+and the import time of tb as reported by python -X importtime
+'''
+
+import os, sys, time
+import subprocess
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+pylib = os.path.abspath(path)
+
+def timeit(code, runs=5):
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        t = time.perf_counter() - start
+        if best == None or t < best:
+            best = t
+    return best
+
+def importtime():
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sys; sys.path.append('{}'); import tb".format(pylib)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    for line in proc.stderr.split("\n"):
+        if line.strip().endswith("| tb"):
+            return int(line.split("|")[1]) / 1000000.0
+
+if __name__ == '__main__':
+    print("{:>24} {:>12}".format("", "time (s)"))
+    print("{:>24} {:>12.4f}".format("import tb (importtime)", importtime()))
+    print("{:>24} {:>12.4f}".format("python", timeit("pass")))
+    print("{:>24} {:>12.4f}".format("import tb", timeit("import sys; sys.path.append('{}'); import tb".format(pylib))))
+    print("{:>24} {:>12.4f}".format("tb --list", timeit("import sys; sys.path.append('{}'); import tb; tb.main(['tb', '--list'])".format(pylib))))
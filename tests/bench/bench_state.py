@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+peak memory and time reading the outputs of a large `terragrunt show -json` state: the former capture
+(run() then json.loads of the whole output) against tb.run_json. Each is measured in its own process,
+with the outputs before the resources, as terraform prints them, and after them
+'''
+
+import os, sys, time, json
+import resource
+import subprocess
+import tempfile, shutil
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+sys.path.append(os.path.abspath(path))
+
+import tb
+
+def fixture(filename, mb, outputs_first=True):
+    outputs = dict(("output_{}".format(i), {"sensitive": False, "value": "value-{}".format(i)}) for i in range(100))
+    resource = {
+        "address": "azurerm_virtual_machine.vm",
+        "type": "azurerm_virtual_machine",
+        "values": {"id": "/subscriptions/x/vm", "tags": {"env": "prep"}, "custom_data": "x" * 2000, "disks": [{"size": 30, "caching": "ReadWrite"}] * 20},
+    }
+    chunk = json.dumps(resource)
+
+    with open(filename, "w") as fh:
+        fh.write('{"format_version": "0.1", "terraform_version": "0.12.10", "values": {')
+        if outputs_first:
+            fh.write('"outputs": {}, '.format(json.dumps(outputs)))
+        fh.write('"root_module": {"resources": [')
+        for i in range(int(mb * 1024 * 1024 / len(chunk))):
+            if i > 0:
+                fh.write(", ")
+            fh.write(chunk)
+        fh.write("]}")
+        if not outputs_first:
+            fh.write(', "outputs": {}'.format(json.dumps(outputs)))
+        fh.write("}}")
+
+def legacy(filename):
+    (out, err, exitcode) = tb.run("cat {}".format(filename))
+    return json.loads(out)["values"]["outputs"]
+
+def current(filename):
+    (outputs, err, exitcode) = tb.run_json("cat {}".format(filename), ["values", "outputs"])
+    return outputs
+
+def measure(method, filename):
+    # in a fresh process, ru_maxrss is its own peak
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), method, filename])
+    return json.loads(out)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        start = time.perf_counter()
+        outputs = {"legacy": legacy, "current": current}[sys.argv[1]](sys.argv[2])
+        assert len(outputs) == 100
+        print(json.dumps({"time": time.perf_counter() - start, "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}))
+        sys.exit(0)
+
+    print("{:>8} {:>8} {:>16} {:>16} {:>12} {:>12}".format("state", "outputs", "legacy (MB)", "current (MB)", "legacy (s)", "current (s)"))
+    root = tempfile.mkdtemp()
+    try:
+        for mb in (10, 100, 300):
+            for outputs_first in (True, False):
+                filename = "{}/state.json".format(root)
+                fixture(filename, mb, outputs_first)
+                old = measure("legacy", filename)
+                new = measure("current", filename)
+                print("{:>6}MB {:>8} {:>16.1f} {:>16.1f} {:>12.3f} {:>12.3f}".format(mb, "first" if outputs_first else "last", old["maxrss"], new["maxrss"], old["time"], new["time"]))
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+"did you mean" suggestions for a rendered template with many unresolved vars: the former check
+(fuzz.ratio of every miss against every var and env var) against Project.check_parsed_text.
+Then a project.yml with many broken vars, with an index built per var against the one shared by the component
+'''
+
+import os, sys, time
+import random
+import tempfile
+import shutil
+import io
+import contextlib
+
+path = os.path.dirname(os.path.realpath(__file__))+'/../../tb'
+sys.path.append(os.path.abspath(path))
+
+import tb
+from fuzzywuzzy import fuzz
+
+def fixture(nvars, nmisses, seed=1):
+    rnd = random.Random(seed)
+    words = ["".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for i in range(rnd.randint(2, 8))) for w in range(300)]
+    names = list(dict.fromkeys("_".join(rnd.sample(words, rnd.randint(2, 4))) for i in range(nvars)))
+    vars = dict((n, "value") for n in names)
+
+    # half of the misses are typos of existing vars, each miss appears twice
+    misses = [rnd.choice(names)[:-1] if i % 2 else "unknown_{}".format(i) for i in range(nmisses)]
+    lines = ['    key{} = "${{{}}}"'.format(i, m) for (i, m) in enumerate(misses + misses)]
+    return vars, "locals {\n" + "\n".join(lines) + "\n}\n"
+
+def legacy(vars, text):
+    msg = ""
+    for line in text.split("\n"):
+        for match in tb.re.finditer(r"\$\{(.+?)\}", line):
+            miss = match.group()
+            for k in list(vars.keys()) + list(os.environ.keys()):
+                if fuzz.ratio(miss, k) >= 80:
+                    msg += k
+    return msg
+
+def current(vars, text):
+    project = tb.Project()
+    project.vars = vars
+    return project.check_parsed_text(text)
+
+def yml_fixture(root, nvars, nbroken, seed=1):
+    vars, text = fixture(nvars, 0, seed)
+    names = list(vars.keys())
+    with open("{}/project.yml".format(root), "w") as fh:
+        for (i, n) in enumerate(names):
+            # typos of other vars
+            value = "${{{}}}".format(names[i-1][:-1]) if i < nbroken else "value"
+            fh.write('{}: "{}"\n'.format(n, value))
+
+class PerVarProject(tb.Project):
+    # the index is built again for every var that has a miss
+    def get_suggestions(self):
+        return tb.Suggestions(list(self.vars.keys()) + list(os.environ.keys()))
+
+def yml_vars(project_class, root):
+    project = project_class(dir=root)
+    with contextlib.redirect_stderr(io.StringIO()):
+        try:
+            project.get_yml_vars()
+        except tb.ErrorParsingYmlVars:
+            pass
+
+def timeit(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    print("{:>8} {:>8} {:>12} {:>12}".format("vars", "misses", "legacy (s)", "current (s)"))
+    for (nvars, nmisses) in ((100, 100), (1000, 100), (1000, 1000), (5000, 2000)):
+        vars, text = fixture(nvars, nmisses)
+        # the former check takes minutes on the largest sizes
+        old = timeit(legacy, vars, text) if nvars * nmisses <= 100000 else float("nan")
+        print("{:>8} {:>8} {:>12.4f} {:>12.4f}".format(nvars, nmisses, old, timeit(current, vars, text)))
+
+    print("")
+    print("{:>8} {:>8} {:>8} {:>12} {:>12}".format("vars", "broken", "env", "per var (s)", "shared (s)"))
+    root = tempfile.mkdtemp()
+    saved = dict(os.environ)
+    try:
+        for (nvars, nbroken, nenv) in ((1000, 30, 300), (1000, 300, 3000)):
+            os.environ.clear()
+            os.environ.update(saved)
+            os.environ.update(("TB_BENCH_ENV_{}".format(i), "x") for i in range(nenv))
+            yml_fixture(root, nvars, nbroken)
+            print("{:>8} {:>8} {:>8} {:>12.4f} {:>12.4f}".format(nvars, nbroken, nenv, timeit(yml_vars, PerVarProject, root), timeit(yml_vars, tb.Project, root)))
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+        shutil.rmtree(root)